@@ -0,0 +1,194 @@
+"""Admission control for booking spikes.
+
+When a popular event opens, every client hits ``/book_event`` at once. Two
+things stand in front of the booking code:
+
+* ``RateLimiter``: a token bucket per key (user, event). A client that books
+  faster than its bucket refills is told to come back later (429).
+* ``WaitingRoom``: a bounded FIFO queue served at the rate the storage layer
+  sustains. A request that finds the room empty and a token free is served
+  right away; otherwise it gets a ticket with its position and an ETA, and the
+  booking runs in the background when its turn comes. A full room rejects at
+  once (503) instead of letting requests time out.
+
+Both are per process: with several workers, each admits its share.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class TokenBucket:
+    """``burst`` tokens, refilled at ``rate`` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now=None):
+        """Take a token if there is one; returns True on success."""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now=None):
+        """Seconds until the next token is available."""
+        self._refill(time.monotonic() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """A token bucket per key, e.g. per user or per event.
+
+    Beyond ``max_keys`` buckets the least recently used ones are dropped,
+    so memory stays bounded whatever keys clients send.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Return 0 if ``key`` may proceed, else the seconds to wait before retrying."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                self._prune()
+            else:
+                self._buckets.move_to_end(key)
+            if bucket.take(now):
+                return 0
+            return bucket.wait_time(now)
+
+    def _prune(self):
+        # Least recently used first. Dropping a bucket that is not full yet
+        # forgives its key a few tokens, which beats an unbounded map.
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class RoomFull(Exception):
+    """The waiting room cannot take more requests."""
+
+
+class Ticket:
+    """A request waiting in (or served by) the waiting room."""
+
+    def __init__(self, number, job, owner):
+        self.number = number
+        self.job = job
+        self.owner = owner
+        self.enqueued = time.monotonic()
+        self.finished = None
+        self.result = None
+        self.done = threading.Event()
+
+
+class WaitingRoom:
+    """Bounded FIFO queue of jobs, run one at a time at ``rate`` per second."""
+
+    def __init__(self, rate, capacity, result_ttl=300, on_served=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.result_ttl = result_ttl
+        self.on_served = on_served  # on_served(seconds waited), e.g. for a histogram
+        self._bucket = TokenBucket(rate, max(1, rate))  # Up to one second of burst
+        self._queue = deque()
+        self._tickets = OrderedDict()  # Ticket id -> Ticket, queued and recently served
+        self._numbers = itertools.count(1)
+        self._served = 0  # Number of the last ticket served
+        self._lock = threading.Condition()
+        self._thread = None
+        self.rejected = 0
+
+    def depth(self):
+        return len(self._queue)
+
+    def run(self, job, owner=None):
+        """Run ``job()`` now if the room is empty and the rate allows it.
+
+        Otherwise queue it and return its Ticket; raises RoomFull when the
+        queue is at capacity. Returns ``(result, None)`` or ``(None, ticket)``;
+        ``owner`` is kept on the ticket so only its owner can poll it.
+        """
+        with self._lock:
+            if not self._queue and self._bucket.take():
+                immediate = True
+            else:
+                immediate = False
+                if len(self._queue) >= self.capacity:
+                    self.rejected += 1
+                    raise RoomFull("Too many bookings waiting, try again shortly.")
+                ticket = Ticket(next(self._numbers), job, owner)
+                self._queue.append(ticket)
+                self._tickets[str(ticket.number)] = ticket
+                self._start()
+                self._lock.notify()
+        if immediate:
+            return job(), None
+        return None, ticket
+
+    def status(self, ticket_id):
+        """``(ticket, position, eta_seconds)``; position 0 means served. None if unknown."""
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                return None
+            if ticket.done.is_set():
+                return ticket, 0, 0.0
+            position = ticket.number - self._served
+            return ticket, position, position / self.rate
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._serve, name="waiting-room", daemon=True)
+            self._thread.start()
+
+    def _serve(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._lock.wait()
+                # Keep the pace of the storage layer, in FIFO order
+                wait = self._bucket.wait_time()
+                if wait > 0:
+                    self._lock.wait(wait)
+                    continue
+                self._bucket.take()
+                ticket = self._queue.popleft()
+
+            if self.on_served is not None:
+                self.on_served(time.monotonic() - ticket.enqueued)
+            try:
+                ticket.result = ticket.job()
+            except Exception as e:
+                ticket.result = e
+            with self._lock:
+                ticket.done.set()
+                ticket.job = None
+                ticket.finished = time.monotonic()
+                self._served = ticket.number
+                self._expire()
+
+    def _expire(self):
+        # Forget results nobody came back for
+        now = time.monotonic()
+        while self._tickets:
+            ticket = next(iter(self._tickets.values()))
+            if not ticket.done.is_set() or now - ticket.finished < self.result_ttl:
+                break
+            self._tickets.popitem(last=False)
@@ -1,67 +1,276 @@
+import bisect
+import click
+import hashlib
+import itertools
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from flask import Flask, request, render_template, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, g, request, render_template, redirect, url_for, session, flash, jsonify, send_file, abort, stream_with_context
+from werkzeug.security import generate_password_hash
+from werkzeug.wsgi import ClosingIterator
 from dotenv import load_dotenv
 from flask_cors import CORS
 import os
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from codec import JSONProvider
+from archive import Archive, archive_data, partition_of
+from storage import IdSequence, JsonStorage, cache
+from sqlite_storage import SqliteStorage, import_json_files
+from blobstore import BlobStore, is_data_uri, parse_data_uri
+from mailer import EmailQueue, QueueFull, is_email_address
+from hasher import HasherBusy, PasswordHasher
+from pagecache import ASSET_MAX_AGE, ENCODINGS, PageCache, Representation, ResponseCache, StaticAssets, encoded_etag, negotiate
+from thumbnails import ThumbnailPipeline
+from scheduler import Scheduler
+from search import SearchIndex
+from admission import RateLimiter, RoomFull, WaitingRoom
+from inventory import DEFAULT_TIER, TIERS, AlreadyBooked, SeatInventory, SoldOut, capacity_field, count_bookings
+from metrics import Counter, Gauge, Histogram, render as render_metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize the Flask application
 app = Flask(__name__)
+app.json = JSONProvider(app)  # orjson when installed
 
 CORS(app)
 
+# Per-endpoint request metrics, exposed on /metrics
+REQUEST_SECONDS = Histogram("eventflow_http_request_duration_seconds", "Request latency by endpoint.", ["endpoint", "method"])
+REQUESTS = Counter("eventflow_http_requests_total", "Requests by endpoint and status code.", ["endpoint", "method", "status"])
+REQUESTS_IN_FLIGHT = Gauge("eventflow_http_requests_in_flight", "Requests being handled right now.", ["endpoint"])
+
+@app.before_request
+def start_request_timer():
+    g.metrics_endpoint = request.endpoint or "unmatched"  # 404s share one label
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint, method, start = g.metrics_endpoint, request.method, g.metrics_start
+    REQUESTS.inc(endpoint=endpoint, method=method, status=response.status_code)
+
+    def finish():
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+
+    if response.is_streamed:
+        # The body of a streamed response (listings, SSE) is produced after
+        # this hook: time the request until the server is done sending it
+        response.call_on_close(finish)
+    else:
+        finish()
+    g.metrics_finished = True
+    return response
+
+@app.teardown_request
+def end_request_timer(exc):
+    # Requests that failed before after_request still leave the in-flight gauge
+    if 'metrics_endpoint' in g and 'metrics_finished' not in g:
+        REQUESTS_IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
+
 app.secret_key = os.getenv("SECRET_KEY", "your_default_secret_key")  # Use environment variable for better security
 
 # Path to the JSON database
 USER_DB = "users.json"
 DATA_FILE = 'data.json'
-BOOKING_DB = "bookings.json"
+BOOKING_DB = "booking.json"
+EVENTS_DB = "events.json"
+NOTIFICATION_DB = "notifications.json"
+SEQUENCES_DB = "sequences.json"  # Last id handed out per collection
+
+# Directory holding uploaded event images, named by their content hash
+MEDIA_DIR = os.getenv("MEDIA_DIR", "media")
+MEDIA_MAX_AGE = 365 * 24 * 3600  # Blob names never change, so let browsers keep them for a year
+blobs = BlobStore(MEDIA_DIR)
+# Resized variants of uploaded images are made in the background (needs Pillow)
+THUMBNAIL_WORKERS = os.getenv("THUMBNAIL_WORKERS")
+thumbnails = ThumbnailPipeline(blobs, workers=int(THUMBNAIL_WORKERS) if THUMBNAIL_WORKERS else None)
+
+# JSON data file of each collection
+DATA_FILES = {
+    "users": USER_DB,
+    "events": EVENTS_DB,
+    "bookings": BOOKING_DB,
+    "notifications": NOTIFICATION_DB,
+}
+
+# Storage backend: "json" keeps the collections in the JSON files above,
+# "sqlite" keeps them in an indexed SQLite database
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_DB = os.getenv("SQLITE_DB", "eventflow.db")
+
+# How the JSON backend persists events, bookings and notifications: "snapshot"
+# rewrites the whole JSON file on every change, "wal" appends each change to
+# <file>.log and folds the log back into the file periodically
+STORAGE_MODE = os.getenv("STORAGE_MODE", "snapshot")
+
+if STORAGE_BACKEND == "sqlite":
+    db = SqliteStorage(SQLITE_DB)
+else:
+    db = JsonStorage(DATA_FILES, cache, IdSequence(SEQUENCES_DB))
+    if STORAGE_MODE == "wal":
+        cache.enable_wal(
+            [EVENTS_DB, BOOKING_DB, NOTIFICATION_DB],
+            fsync_interval=float(os.getenv("WAL_FSYNC_INTERVAL", "0.05")),
+            compact_every=int(os.getenv("WAL_COMPACT_EVERY", "1000")),
+        )
+
+# Past events, their bookings and old notifications, moved out of the live
+# collections by `flask archive` into files per month
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+archive = Archive(ARCHIVE_DIR)
+
+# Seats sold per event and tier, in lock-striped files so bookings of
+# different events do not wait for each other
+SEATS_DIR = os.getenv("SEATS_DIR", "seats")
+seats = SeatInventory(
+    SEATS_DIR,
+    lambda event_id: db.find("bookings", event_id=event_id),
+    stripes=int(os.getenv("SEAT_LOCK_STRIPES", "64")),
+)
+
+# Admission control for booking spikes: a token bucket per user and per event,
+# then a FIFO waiting room served at the rate the storage layer sustains
+booking_users = RateLimiter(float(os.getenv("BOOKING_USER_RATE", "1")), float(os.getenv("BOOKING_USER_BURST", "5")))
+booking_events = RateLimiter(float(os.getenv("BOOKING_EVENT_RATE", "200")), float(os.getenv("BOOKING_EVENT_BURST", "400")))
+BOOKING_WAIT_SECONDS = Histogram("eventflow_booking_queue_wait_seconds", "Time bookings spent in the waiting room.")
+BOOKINGS_ADMITTED = Counter("eventflow_bookings_admitted_total", "Bookings let through, at once or after queueing.", ["path"])
+BOOKING_REJECTIONS = Counter("eventflow_booking_rejections_total", "Bookings turned away by admission control.", ["reason"])
+waiting_room = WaitingRoom(
+    float(os.getenv("BOOKING_RATE", "100")),
+    int(os.getenv("WAITING_ROOM_SIZE", "5000")),
+    on_served=BOOKING_WAIT_SECONDS.observe,
+)
+Gauge("eventflow_booking_queue_depth", "Bookings waiting in the waiting room.", function=waiting_room.depth)
+
+# A 429/503 response telling the client when to come back
+def booking_rejected(reason, message, status, retry_after):
+    BOOKING_REJECTIONS.inc(reason=reason)
+    return {"message": message}, status, {"Retry-After": str(max(1, int(retry_after + 0.999)))}
 
 # SMTP credentials loaded from environment variables
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")  # Load SMTP_USER from .env
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")  # Load SMTP_PASSWORD from .env
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"  # Disable for a local test SMTP server
+
+# Outbound email is sent in the background by workers holding open SMTP connections
+email_queue = EmailQueue(
+    SMTP_SERVER,
+    SMTP_PORT,
+    SMTP_USER,
+    SMTP_PASSWORD,
+    starttls=SMTP_STARTTLS,
+    workers=int(os.getenv("EMAIL_WORKERS", "2")),
+    max_queue=int(os.getenv("EMAIL_QUEUE_SIZE", "10000")),
+)
+Gauge("eventflow_email_queue_depth", "Emails waiting to be sent.", function=email_queue.depth)
+
+# Password hashing runs in worker processes; when all of them are busy and the
+# queue is full, logins and registrations get a 429 instead of waiting
+PASSWORD_WORKERS = os.getenv("PASSWORD_WORKERS")
+passwords = PasswordHasher(
+    workers=int(PASSWORD_WORKERS) if PASSWORD_WORKERS else None,
+    max_pending=int(os.getenv("PASSWORD_QUEUE_SIZE", "0")) or None,
+)
+PASSWORD_RETRY_AFTER = "1"  # Seconds, sent in the Retry-After header of a 429
+
+# Appointment reminders wait in a persistent scheduler until they are due
+REMINDERS_FILE = os.getenv("REMINDERS_FILE", "reminders.log")
+REMINDER_LEAD_SECONDS = int(os.getenv("REMINDER_LEAD_SECONDS", "3600"))  # How long before the appointment
+REMINDER_RETRY_SECONDS = 60  # When the email queue is full
+
+def reminder_email_body(date, time_input):
+    return f"""
+    Dear Recipient,
 
-# Load users from the JSON file
-def load_users():
-    try:
-        with open(USER_DB, "r") as file:
-            users = json.load(file)
-    except FileNotFoundError:
-        users = []
+    This is a reminder from **Event Flow**: your appointment is scheduled for **{date}** at **{time_input}**.
+
+    Best regards,
+    The **Event Flow** Team
+    """
 
-    # Check if the admin user exists; if not, create the admin user with password '1234'
-    if not any(u["username"] == "admin" for u in users):
+# Local time to the minute, e.g. "2025-03-01T18:30", as stored on bookings and notifications
+def timestamp():
+    return datetime.now().isoformat(timespec='minutes')
+
+# Deliver due reminders: an email each and their in-app notifications in one write
+def send_reminders(jobs):
+    notifications = []
+    for job in jobs:
+        try:
+            email_queue.enqueue(job["to_email"], "Appointment reminder from Event Flow", reminder_email_body(job["date"], job["time"]))
+        except QueueFull:
+            retry = {key: value for key, value in job.items() if key != "id"}
+            reminders.schedule(time.time() + REMINDER_RETRY_SECONDS, retry)
+            continue
+        except ValueError as e:
+            print(f"Skipped reminder {job['id']}: {e}")
+            continue
+        notifications.append({
+            "user_email": job["to_email"],
+            "text": f"Reminder: your appointment is on {job['date']} at {job['time']}.",
+            "created_at": timestamp(),
+        })
+    if notifications:
+        db.insert_many("notifications", notifications)
+
+reminders = Scheduler(REMINDERS_FILE, send_reminders, batch_size=int(os.getenv("REMINDER_BATCH_SIZE", "100")))
+Gauge("eventflow_reminders_pending", "Reminders waiting to be sent by this process.", function=reminders.depth)
+
+@app.before_request
+def start_reminders():
+    # Reload and dispatch pending reminders once the app serves requests
+    reminders.start()
+
+# Schedule the reminder of an appointment; returns its send time, or None if there is none to send
+def schedule_reminder(to_email, date, time_input):
+    try:
+        appointment = datetime.strptime(f"{date} {time_input}", "%Y-%m-%d %H:%M").timestamp()
+    except (TypeError, ValueError):
+        return None
+    now = time.time()
+    if appointment <= now:
+        return None
+    due = max(appointment - REMINDER_LEAD_SECONDS, now)
+    reminders.schedule(due, {"to_email": to_email, "date": date, "time": time_input})
+    return due
+
+# Render a form page again with a "busy" message and a 429 status
+def hasher_busy(template, error):
+    flash(str(error), "danger")
+    return render_template(template), 429, {"Retry-After": PASSWORD_RETRY_AFTER}
+
+# Check if the admin user exists; if not, create the admin user with password '1234'
+def ensure_admin_user():
+    if db.find_one("users", username="admin") is None:
         # Hash password '1234' for admin user
         admin_password = generate_password_hash("1234")
-        users.append({"username": "admin", "password": admin_password, "email": "admin@example.com", "role": "admin"})
-        save_users(users)
+        db.insert("users", {"username": "admin", "password": admin_password, "email": "admin@example.com", "role": "admin"})
 
-    return users
+# Load users from storage
+def load_users():
+    ensure_admin_user()
+    return db.all("users")
 
-def load_bookings():
-    try:
-        with open(BOOKING_DB, "r") as file:
-            bookings = json.load(file)
-    except FileNotFoundError:
-        bookings = []
+# Look up a single user by username (an indexed lookup in both backends)
+def find_user(username):
+    ensure_admin_user()
+    return db.find_one("users", username=username)
 
-# Save users to the JSON file
-def save_users(users):
-    with open(USER_DB, "w") as file:
-        json.dump(users, file, indent=4)
+def load_bookings():
+    return db.all("bookings")
 
-# Function to send the email
-def send_email_immediately(to_email, subject, date, time_input):
+# Function to build the appointment email
+def appointment_email_body(date, time_input):
     # Create the email content
-    email_content = f"""
+    return f"""
     Dear Recipient,
 
     We hope you are doing well. This is a notification from **Event Flow**, your go-to platform for managing event bookings.
@@ -74,26 +283,10 @@ def send_email_immediately(to_email, subject, date, time_input):
     The **Event Flow** Team
     """
 
-    # Set up the MIME
-    msg = MIMEMultipart()
-    msg['From'] = SMTP_USER
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(email_content, 'plain'))
-
-    # Send the email using SMTP server
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()  # Secure the connection
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(SMTP_USER, to_email, msg.as_string())
-    except Exception as e:
-        raise Exception(f"Failed to send email: {e}")
-
 # Route for sending email
 @app.route('/send-email', methods=['POST'])
 def send_email():
-    """Handle sending an email immediately with time and description."""
+    """Queue the appointment email; it is sent in the background."""
     if request.method == 'POST':
         # Capture the form data
         to_email = request.json.get('to_email')
@@ -101,18 +294,43 @@ def send_email():
         date = request.json.get('date')
         time_input = request.json.get('time')
 
-        # Simply send the email immediately
+        if not to_email:
+            return jsonify({
+                "message": "Missing recipient email.",
+                "status_code": 400
+            }), 400
+        if not is_email_address(to_email):
+            return jsonify({
+                "message": "Recipient must be a single email address.",
+                "status_code": 400
+            }), 400
+
+        # Hand the email to the background workers
         try:
-            send_email_immediately(to_email, subject, date, time_input)
+            email_queue.enqueue(to_email, subject, appointment_email_body(date, time_input))
+            reminder_at = schedule_reminder(to_email, date, time_input)
             return jsonify({
-                "message": f"Email sent successfully to {to_email}!",
-                "status_code": 200
-            }), 200
-        except Exception as e:
+                "message": f"Email to {to_email} queued for sending.",
+                "status_code": 202,
+                "queue_depth": email_queue.depth(),
+                "reminder_at": datetime.fromtimestamp(reminder_at).isoformat(timespec='minutes') if reminder_at else None
+            }), 202
+        except QueueFull as e:
             return jsonify({
-                "message": f"Failed to send email: {str(e)}",
-                "status_code": 500
-            }), 500
+                "message": str(e),
+                "status_code": 503
+            }), 503
+
+# Route reporting the state of the outbound email queue
+@app.route('/reminders', methods=['GET'])
+def reminder_stats():
+    """Report the reminder scheduler: pending and fired reminders and the next send time."""
+    return jsonify(reminders.stats()), 200
+
+@app.route('/email_queue', methods=['GET'])
+def email_queue_stats():
+    """Report queue depth and send/retry/failure counters of the email workers."""
+    return jsonify(email_queue.stats()), 200
 # # Function to send the email
 # def send_email_immediately(to_email, subject, description, date, time_input):
 #     """Function to send an email with the given details."""
@@ -158,12 +376,13 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
 
-        # Load users from JSON
-        users = load_users()
-
         # Login logic
-        user = next((u for u in users if u["username"] == username), None)
-        if user and check_password_hash(user["password"], password):
+        user = find_user(username)
+        try:
+            valid = user is not None and passwords.check(user["password"], password)
+        except HasherBusy as e:
+            return hasher_busy('login.html', e)
+        if valid:
             session['user'] = username
             session['role'] = user.get('role', 'user')  # Default role is 'user'
             session['email'] = user.get('email')
@@ -184,12 +403,13 @@ def admin_login():
         username = request.form.get('username')
         password = request.form.get('password')
 
-        # Load users from JSON
-        users = load_users()
-
         # Admin login logic
-        user = next((u for u in users if u["username"] == username), None)
-        if user and check_password_hash(user["password"], password) and user.get('role') == 'admin':
+        user = find_user(username)
+        try:
+            valid = user is not None and passwords.check(user["password"], password)
+        except HasherBusy as e:
+            return hasher_busy('admin_index.html', e)
+        if valid and user.get('role') == 'admin':
             session['user'] = username
             session['role'] = 'admin'
             session['email'] = user.get('email','')
@@ -210,16 +430,15 @@ def register():
         password = request.form.get('password')
         email = request.form.get('email')
 
-        # Load users from JSON
-        users = load_users()
-
         # Registration logic
-        if any(u["username"] == username for u in users):
+        if find_user(username):
             flash("Username already exists. Please choose a different one.", "danger")
         else:
-            hashed_password = generate_password_hash(password)
-            users.append({"username": username, "password": hashed_password, "email": email, "role": "user"})
-            save_users(users)
+            try:
+                hashed_password = passwords.hash(password)
+            except HasherBusy as e:
+                return hasher_busy('register.html', e)
+            db.insert("users", {"username": username, "password": hashed_password, "email": email, "role": "user"})
             flash("Registration successful! You can now log in.", "success")
             return redirect(url_for('login'))
 
@@ -282,17 +501,15 @@ def admin_dashboard():
         username = request.form.get('username')
 
         if action == "delete":
-            # Remove user from the database
-            users = [user for user in users if user["username"] != username]
-            save_users(users)
+            # Remove user from the database; one locked write, so concurrent sign-ups are kept
+            db.delete("users", username=username)
+            users = load_users()
             flash(f"User '{username}' has been deleted.", "success")
 
         elif action == "promote":
-            # Promote user to admin
-            for user in users:
-                if user["username"] == username:
-                    user["role"] = "admin"
-            save_users(users)
+            # Promote user to admin, in place under the lock
+            db.update("users", {"role": "admin"}, username=username)
+            users = load_users()
             flash(f"User '{username}' has been promoted to admin.", "success")
 
         elif action == "add":
@@ -302,47 +519,116 @@ def admin_dashboard():
             new_email = request.form.get('new_email')
 
             # Check if the username already exists
-            if any(u["username"] == new_username for u in users):
+            if find_user(new_username):
                 flash("Username already exists. Please choose a different one.", "danger")
             else:
-                hashed_password = generate_password_hash(new_password)
-                users.append({"username": new_username, "password": hashed_password, "email": new_email, "role": "user"})
-                save_users(users)
+                try:
+                    hashed_password = passwords.hash(new_password)
+                except HasherBusy as e:
+                    flash(str(e), "danger")
+                    return render_template('admin.html', users=users), 429, {"Retry-After": PASSWORD_RETRY_AFTER}
+                db.insert("users", {"username": new_username, "password": hashed_password, "email": new_email, "role": "user"})
+                users = load_users()
                 flash(f"User '{new_username}' has been added.", "success")
     
     return render_template('admin.html', users=users)
 
-def add_event_to_file(event_data, file_path='events.json'):
+# Store an inline image in the blob store; returns the event linking to it
+def store_event_image(event, data_uri):
+    mime_type, raw = parse_data_uri(data_uri)
+    name = blobs.put(raw, mime_type)
+    return link_image_variants(dict(event, image=blobs.url_for(name)), name, raw)
+
+# Have the resized variants of image ``name`` made, and show the card-sized one
+def link_image_variants(event, name, raw):
+    if not thumbnails.available:
+        return event
+    thumbnails.submit(name, raw)
+    images = thumbnails.urls(name)
+    images["original"] = blobs.url_for(name)
+    return dict(event, image=images["card"]["webp"], images=images)
+
+def add_event_to_file(event_data):
     try:
-        # Read the existing data from the file
-        try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            # If file doesn't exist, initialize with an empty list
-            data = []
+        # Store the image in the blob store and keep only its URL in the event
+        if is_data_uri(event_data.get('image')):
+            event_data = store_event_image(event_data, event_data['image'])
 
-        # Ensure the data in the file is a list
-        if not isinstance(data, list):
-            raise ValueError("The JSON file should contain an array.")
-        # Calculate the index
-        index = len(data)
+        # Save the event; storage assigns its event_id
+        db.insert("events", event_data)
 
-        # Add the index to the event_data
-        event_data['event_id'] = index+1  # Assuming event_data is a dictionary
-
-        # Append the new event to the list
-        data.append(event_data)
-
-        # Write the updated data back to the file
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        # Index the new event for /search_events; version first, so a write
+        # in between leaves the index behind (caught up later), never ahead
+        version = db.version("events")
+        search_index.sync(db.all("events"), version)
 
         return {"message": "Event added successfully"}, 200
 
+    except ValueError as e:
+        return {"message": str(e)}, 400
     except Exception as e:
         return {"message": f"An error occurred: {e}"}, 500
 
+# Move inline base64 images of existing events into the blob store
+def migrate_event_images():
+    events = db.all("events")
+
+    migrated = 0
+    updated_events = []
+    for event in events:
+        if is_data_uri(event.get('image')):
+            try:
+                event = store_event_image(event, event['image'])
+            except ValueError as e:
+                # Not a supported image type: leave it inline, where it is only ever shown through <img>
+                print(f"Skipped the image of event {event.get('event_id')}: {e}")
+            else:
+                migrated += 1
+        elif 'images' not in event and thumbnails.available:
+            # Migrated before variants existed: make them from the stored original
+            name = blobs.name_of(event.get('image'))
+            if name is not None and os.path.exists(blobs.path_for(name)):
+                with open(blobs.path_for(name), 'rb') as file:
+                    event = link_image_variants(event, name, file.read())
+                migrated += 1
+        updated_events.append(event)
+
+    if migrated:
+        db.replace_all("events", updated_events)
+    return migrated
+
+@app.cli.command('migrate-images')
+def migrate_images_command():
+    """Move inline base64 event images out of events.json into the blob store and resize them."""
+    migrated = migrate_event_images()
+    thumbnails.shutdown()  # Wait for the resized variants
+    print(f"Migrated {migrated} event image(s) to {blobs.root}.")
+
+# Route serving uploaded event images
+@app.route('/media/<name>', methods=['GET'])
+def media(name):
+    """Serve an event image from the blob store with long-lived cache headers."""
+    try:
+        path = blobs.path_for(name)
+    except ValueError:
+        abort(404)
+    if not os.path.exists(path):
+        # A variant still being resized: show the original meanwhile, without caching the detour
+        original = blobs.original_of(name)
+        if original is None:
+            abort(404)
+        response = redirect(blobs.url_for(original))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    response = send_file(
+        path, mimetype=blobs.mime_type_for(name), etag=blobs.etag_for(name), max_age=MEDIA_MAX_AGE, conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'  # Never let a browser guess another type
+    return response
+
 @app.route('/add_event', methods=['POST'])
 def add_event():
     try:
@@ -365,6 +651,19 @@ def add_event():
         if missing_fields:
             return {"message": f"Missing required fields: {', '.join(missing_fields)}"}, 400
 
+        # Seat limits per tier are optional; a tier without one is unlimited
+        for tier in TIERS:
+            field = capacity_field(tier)
+            if event_data.get(field) in (None, ""):
+                event_data.pop(field, None)
+                continue
+            try:
+                event_data[field] = int(event_data[field])
+            except (TypeError, ValueError):
+                event_data[field] = -1
+            if event_data[field] < 0:
+                return {"message": f"{field} must be a whole number of seats."}, 400
+
         # Add the event to the file
         response, status_code = add_event_to_file(event_data)
         return (response), status_code
@@ -373,49 +672,326 @@ def add_event():
         return ({"message": f"An error occurred: {e}"}), 500
 
 
+# Page size limits for /get_events
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Position of each event in the listing, used to resume from a cursor
+def build_event_positions(events):
+    return {event['event_id']: position for position, event in enumerate(events)}
+
+# Sort key of an event for a date range bound: "YYYY-MM-DD" bounds compare
+# dates only, "YYYY-MM-DDTHH:MM" bounds compare date and time. A missing or
+# malformed date (null, a number) sorts first instead of failing mid-stream.
+def event_moment(event, bound):
+    date = event.get('date')
+    date = date if isinstance(date, str) else ''
+    if 'T' in bound:
+        time_of_day = event.get('time')
+        return f"{date}T{time_of_day if isinstance(time_of_day, str) else ''}"
+    return date
+
+def in_date_range(event, date_from, date_to):
+    if date_from and event_moment(event, date_from) < date_from:
+        return False
+    if date_to and event_moment(event, date_to) > date_to:
+        return False
+    return True
+
+# Events from position ``start`` on that pass the filters, produced lazily.
+# The end is fixed up front: appends to the cached list during a streamed
+# response then do not leak into it.
+def filter_events(events, start, date_from, date_to, fields):
+    for event in itertools.islice(events, start, len(events)):
+        if not in_date_range(event, date_from, date_to):
+            continue
+        if fields:
+            event = {key: value for key, value in event.items() if key in fields or key == 'event_id'}
+        yield event
+
+# Page through the events starting after the cursor, applying the filters.
+# Without a limit the events are returned as a generator, to be streamed.
+def select_events(events, start, limit, date_from, date_to, fields):
+    selected = filter_events(events, start, date_from, date_to, fields)
+    if limit is None:
+        return selected, None
+
+    page = list(itertools.islice(selected, limit))
+    next_cursor = None
+    if page and next(selected, None) is not None:
+        # There is at least one more event: hand out a cursor to it
+        next_cursor = str(page[-1]['event_id'])
+    return page, next_cursor
+
+# Responses are sent in pieces of about this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Serialize ``items`` as a JSON array piece by piece, so the whole document is
+# never held in memory. The output is compact like jsonify's in production; in
+# debug mode it uses spaced separators but, unlike jsonify, no indentation.
+#
+# The first chunk is built before the response is returned, so an error in it
+# still becomes a 500. Later errors can no longer change the status: they are
+# logged and the connection is cut before the closing bracket, so the client
+# sees a broken transfer rather than a valid-looking truncated array.
+def stream_json_array(items):
+    def generate():
+        separators = (',', ':') if not app.debug else (', ', ': ')
+        chunk = ["["]
+        size = 1
+        first = True
+        for item in items:
+            piece = app.json.dumps(item, separators=separators)
+            if not first:
+                chunk.append(",")
+            chunk.append(piece)
+            size += len(piece) + 1
+            first = False
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk = []
+                size = 0
+        chunk.append("]\n")
+        yield "".join(chunk)
+
+    chunks = generate()
+    first = next(chunks)
+
+    def stream():
+        yield first
+        try:
+            yield from chunks
+        except Exception as e:
+            print(f"Error while streaming {request.path}: {e}")
+            raise
+
+    return app.response_class(stream_with_context(stream()), mimetype=app.json.mimetype)
+
+# JSON responses at least this large are compressed for clients that accept it
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# Compressed JSON bodies by path and ETag, i.e. by data version and query
+json_bodies = ResponseCache(int(os.getenv("JSON_CACHE_BYTES", str(64 * 1024 * 1024))))
+
+# A streamed body compressed chunk by chunk, so memory stays flat. The
+# compressed bytes are also collected, up to ``limit``, and handed to
+# ``on_complete`` at the end to be cached.
+def gzip_stream(chunks, limit, on_complete):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: with a gzip header
+    kept = []
+    size = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            size += len(data)
+            if size > limit:
+                kept = None  # Too big to cache; keep streaming
+            elif kept is not None:
+                kept.append(data)
+            yield data
+    data = compressor.flush()
+    yield data
+    if kept is not None and size + len(data) <= limit:
+        on_complete(b"".join(kept) + data)
+
+@app.after_request
+def compress_json_response(response):
+    """Compress large JSON responses that carry an ETag, once per ETag."""
+    etag, _ = response.get_etag()
+    if etag is None or response.status_code != 200 or response.mimetype != app.json.mimetype:
+        return response
+    response.vary.add('Accept-Encoding')
+    if negotiate(request.headers.get('Accept-Encoding'), ENCODINGS) == 'identity':
+        return response  # Streamed as before
+
+    key = (request.path, etag)
+    body = json_bodies.get(key)
+    if body is not None and negotiate(request.headers.get('Accept-Encoding'), body.variants) not in body.variants:
+        body = None  # Only a gzip copy is cached, and this client does not take gzip
+    if body is None and response.is_streamed:
+        # Never read a streamed listing into memory: gzip it on the way out
+        # and cache the result if it turns out small enough
+        if negotiate(request.headers.get('Accept-Encoding'), ('gzip',)) != 'gzip':
+            return response
+        mimetype = response.mimetype
+
+        def cache(data):
+            json_bodies.put(key, Representation(None, mimetype, etag, variants={"gzip": data}))
+
+        # Closing the response must still close the original stream (and its request context)
+        response.response = ClosingIterator(
+            gzip_stream(response.iter_encoded(), json_bodies.max_bytes // 16, cache), response.response.close
+        )
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(encoded_etag(etag, 'gzip'))
+        return response
+    if body is None:
+        raw = response.get_data()
+        if len(raw) < COMPRESS_MIN_SIZE:
+            return response
+        # Levels that compress a large listing in milliseconds, not seconds
+        body = json_bodies.put(key, Representation(raw, response.mimetype, etag, gzip_level=6, brotli_quality=5))
+    data, status, headers = body.response(request.headers, response.headers.get('Cache-Control', 'no-cache'))
+    if response.is_streamed and hasattr(response.response, 'close'):
+        response.response.close()  # Served from the cache: stop the stream and release its request context
+    response.set_data(data)
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+# A 304 if the client already holds ``etag``, in any encoding; otherwise None
+def not_modified(etag):
+    for encoding in ('identity',) + ENCODINGS:
+        tag = encoded_etag(etag, encoding)
+        if request.if_none_match.contains(tag):
+            response = app.response_class(status=304)
+            response.set_etag(tag)
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
 @app.route('/get_events', methods=['GET'])
 def get_events():
+    """List events.
+
+    Optional query parameters: limit and cursor for pagination (the next
+    cursor is returned in the X-Next-Cursor header), fields for a comma
+    separated projection and from/to for a date (or date and time) range.
+    Responses carry an ETag and answer If-None-Match with 304.
+    """
     try:
-        # Read the existing data from the file
-        try:
-            with open('events.json', 'r') as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            # If file doesn't exist, return an empty list
-            return jsonify([])
+        # The ETag only depends on the events data and the query
+        etag = hashlib.sha1(f"{db.etag('events')}?{request.query_string.decode()}".encode()).hexdigest()
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
+        if cursor is not None and limit is None:
+            limit = DEFAULT_PAGE_SIZE
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        fields = set(filter(None, request.args.get('fields', '').split(',')))
+
+        # Read the events from storage
+        data = db.all("events")
 
         # Ensure the data in the file is a list
         if not isinstance(data, list):
             raise ValueError("The JSON file should contain an array.")
 
-        return jsonify(data),200
+        start = 0
+        if cursor is not None:
+            positions = db.derive('event_positions', ["events"], build_event_positions)
+            try:
+                start = positions[int(cursor)] + 1
+            except (KeyError, ValueError):
+                return jsonify({"message": "Invalid cursor."}), 400
+
+        page, next_cursor = select_events(data, start, limit, request.args.get('from'), request.args.get('to'), fields)
+
+        response = stream_json_array(page)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'  # Always revalidate, usually with a 304
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
     except Exception as e:
         return jsonify({"message": f"An error occurred: {e}"}), 500
-    
-def book_event_to_file(event_id, file_path='booking.json'):
-    try:
-        # Read the existing data from the file
+
+# Words of event titles and descriptions, kept up to date as events are added
+search_index = SearchIndex()
+PRICE_FIELDS = {tier: "amount" + tier.capitalize() for tier in TIERS}
+
+# True if the price of ``tier`` (of any tier if None) is within the bounds
+def price_in_range(event, tier, min_price, max_price):
+    for field in ([PRICE_FIELDS[tier]] if tier else PRICE_FIELDS.values()):
         try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            # If file doesn't exist, initialize with an empty list
-            data = []
+            price = float(event.get(field))
+        except (TypeError, ValueError):
+            continue
+        if (min_price is None or price >= min_price) and (max_price is None or price <= max_price):
+            return True
+    return False
+
+@app.route('/search_events', methods=['GET'])
+def search_events():
+    """Search events by the words of their title and description, best matches first.
+
+    Query parameters: q (words or word prefixes, all must match), from/to for
+    a date range as in /get_events, tier with min_price/max_price for a price
+    range, limit, offset and fields.
+    """
+    try:
+        etag = hashlib.sha1(f"{db.etag('events')}?{request.query_string.decode()}".encode()).hexdigest()
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        tier = request.args.get('tier')
+        if tier and tier not in TIERS:
+            return jsonify({"message": f"Unknown tier, choose one of: {', '.join(TIERS)}."}), 400
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        filter_price = tier or min_price is not None or max_price is not None
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        date_from, date_to = request.args.get('from'), request.args.get('to')
+        fields = set(filter(None, request.args.get('fields', '').split(',')))
+
+        version = db.version("events")
+        events = db.all("events")
+        matches = (events[position] for position in search_index.search(request.args.get('q', ''), events, version))
+        matches = (
+            event for event in matches
+            if in_date_range(event, date_from, date_to)
+            and (not filter_price or price_in_range(event, tier, min_price, max_price))
+        )
+        page = list(itertools.islice(matches, offset, offset + limit))
+        if fields:
+            page = [{key: value for key, value in event.items() if key in fields or key == 'event_id'} for event in page]
+
+        response = jsonify(page)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response, 200
+    except Exception as e:
+        return jsonify({"message": f"An error occurred: {e}"}), 500
 
-        # Ensure the data in the file is a list
-        if not isinstance(data, list):
-            raise ValueError("The JSON file should contain an array.")
-        # Calculate the index
-        index = len(data)
+# Look up an event by an id that may arrive as a string
+def find_event(event_id):
+    try:
+        return db.find_one("events", event_id=int(event_id))
+    except (TypeError, ValueError):
+        return None
 
-        booking_data = {"event_id": event_id, "booking_id": index+1, "user_email": session.get('email')}
+def book_event_to_file(event_id, tier=DEFAULT_TIER, user_email=None):
+    try:
+        if not user_email:
+            return {"message": "User not logged in."}, 401
+        if tier not in TIERS:
+            return {"message": f"Unknown tier, choose one of: {', '.join(TIERS)}."}, 400
+        event = find_event(event_id)
+        if event is None:
+            return {"message": "Event not found."}, 404
+
+        # Take the seat first; only one booking per user and never more than the capacity.
+        # The inventory also counts it towards the admin statistics of its day.
+        booked_at = timestamp()
+        try:
+            seats.reserve(event, user_email, tier, day=booked_at[:10])
+        except (AlreadyBooked, SoldOut) as e:
+            return {"message": str(e)}, 409
 
-        # Append the new event to the list
-        data.append(booking_data)
+        booking_data = {"event_id": event["event_id"], "user_email": user_email, "tier": tier, "booked_at": booked_at}
 
-        # Write the updated data back to the file
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        # Save the booking; storage assigns its booking_id
+        try:
+            db.insert("bookings", booking_data)
+        except Exception:
+            seats.release(event["event_id"], user_email)
+            raise
 
         return {"message": "Event added successfully"}, 200
 
@@ -425,28 +1001,91 @@ def book_event_to_file(event_id, file_path='booking.json'):
 @app.route('/book_event', methods=['POST'])
 def book_event():
     event_id = request.json.get('event_id')
-    print("session ",session.get('email'))
-    response, status_code = book_event_to_file(event_id)
-    return (response), status_code
+    tier = request.json.get('tier') or DEFAULT_TIER
+    user_email = session.get('email')
+    if not user_email:
+        return {"message": "User not logged in."}, 401
 
-def get_events_for_user(user_email, events_file='events.json', bookings_file='booking.json'):
+    wait = booking_users.allow(user_email)
+    if wait:
+        return booking_rejected("user_rate", "Too many booking attempts, slow down.", 429, wait)
+    # Only existing events get a bucket, so clients cannot grow the limiter with made-up ids
+    event = find_event(event_id)
+    if event is None:
+        return {"message": "Event not found."}, 404
+    wait = booking_events.allow(event["event_id"])
+    if wait:
+        return booking_rejected("event_rate", "This event is getting too many bookings, try again shortly.", 429, wait)
+
+    # Booked right away when nobody is waiting, otherwise the client gets a ticket
     try:
-        # Read events.json file
-        with open(events_file, 'r') as events_file:
-            events = json.load(events_file)
-
-        # Read booking.json file
-        with open(bookings_file, 'r') as bookings_file:
-            bookings = json.load(bookings_file)
-
-        # Filter the booking records for the given user_email
-        user_bookings = [booking for booking in bookings if booking['user_email'] == user_email]
-
-        # Extract event_ids from the user bookings
-        user_event_ids = {booking['event_id'] for booking in user_bookings}
-
-        # Filter the events.json data to get only the events corresponding to the user's bookings
-        filtered_events = [event for event in events if event['event_id'] in user_event_ids]
+        result, ticket = waiting_room.run(lambda: book_event_to_file(event["event_id"], tier, user_email), user_email)
+    except RoomFull as e:
+        return booking_rejected("room_full", str(e), 503, waiting_room.capacity / waiting_room.rate)
+    if ticket is None:
+        BOOKINGS_ADMITTED.inc(path="immediate")
+        response, status_code = result
+        return (response), status_code
+    BOOKINGS_ADMITTED.inc(path="queued")
+    return booking_status_of(ticket.number, user_email)
+
+# Result of a queued booking, or its place in the queue
+def booking_status_of(ticket_id, user_email):
+    status = waiting_room.status(str(ticket_id))
+    if status is None or status[0].owner != user_email:
+        return {"message": "Unknown or expired ticket."}, 404
+    ticket, position, eta = status
+    if ticket.done.is_set():
+        if isinstance(ticket.result, Exception):
+            return {"message": f"An error occurred: {ticket.result}"}, 500
+        response, status_code = ticket.result
+        return (response), status_code
+    return {"ticket": str(ticket_id), "position": position, "eta": round(eta, 1)}, 202
+
+@app.route('/booking_status', methods=['GET'])
+def booking_status():
+    """Poll a queued booking: 202 with position and ETA while waiting, then its result."""
+    return booking_status_of(request.args.get('ticket', ''), session.get('email'))
+
+@app.route('/event_seats', methods=['GET'])
+def event_seats():
+    """Capacity, seats sold and seats left per tier of one event."""
+    event = find_event(request.args.get('event_id'))
+    if event is None:
+        return {"message": "Event not found."}, 404
+    return jsonify({"event_id": event["event_id"], "tiers": seats.availability(event)}), 200
+
+# Index bookings by user email and events by event_id
+def build_booking_indexes(events, bookings):
+    events_by_id = {event['event_id']: event for event in events}
+
+    bookings_by_email = {}
+    for booking in bookings:
+        email = booking.get('user_email')
+        if isinstance(email, str):
+            bookings_by_email.setdefault(email, []).append(booking)
+
+    return events_by_id, bookings_by_email
+
+# Events of the given bookings, in booking order and without duplicates
+def booked_events(user_bookings, find_event):
+    seen = set()
+    user_events = []
+    for booking in user_bookings:
+        event_id = booking.get('event_id')
+        if event_id in seen:
+            continue
+        seen.add(event_id)
+        event = find_event(event_id)
+        if event is not None:
+            user_events.append(event)
+    return user_events
+
+def get_events_for_user(user_email):
+    try:
+        # Indexed lookups of the user's bookings and of each booked event
+        user_bookings = db.find("bookings", user_email=user_email)
+        filtered_events = booked_events(user_bookings, lambda event_id: db.find_one("events", event_id=event_id))
 
         return filtered_events, 200  # Returning both events and status code
 
@@ -463,40 +1102,36 @@ def get_user_events():
     if not user_email:
         return {"message": "User not logged in."}, 401
 
+    # The list only changes with the user's bookings and the events booked
+    etag = hashlib.sha1(f"{user_email}:{db.etag('events')}:{db.etag('bookings')}".encode()).hexdigest()
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
     events, status_code = get_events_for_user(user_email)  # This will now work properly
-    return jsonify(events), status_code
+    response = jsonify(events)
+    if status_code == 200:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response, status_code
 
 
-def cancelRegistration(event_id, user_email, bookings_file='booking.json'):
+def cancelRegistration(event_id, user_email):
     try:
-        # Read the booking.json file
-        with open(bookings_file, 'r') as file:
-            bookings = json.load(file)
-
-        print("Original Bookings:", bookings)
-
-        # Filter the bookings, keeping those that don't match the specified event_id and user_email
-        updated_bookings = []
-        for booking in bookings:
-            try:
-                # Check if both event_id and user_email match the specified values
-                if booking.get('event_id') and booking.get('user_email'):
-                    if int(booking['event_id']) == int(event_id) and booking['user_email'] == user_email:
-                        continue  # Skip this booking as it matches
-                updated_bookings.append(booking)
-            except (ValueError, TypeError) as e:
-                print(f"Error with booking {booking}: {e}")
-                updated_bookings.append(booking)
+        try:
+            event_id = int(event_id)
+        except (ValueError, TypeError):
+            return {"message": "No matching booking found to cancel."}, 404
 
-        print("Updated Bookings:", updated_bookings)
+        # Remove the bookings matching both the event_id and the user_email
+        removed = db.delete("bookings", event_id=event_id, user_email=user_email)
 
         # If no changes were made, return a message indicating no such booking was found
-        if len(updated_bookings) == len(bookings):
+        if not removed:
             return {"message": "No matching booking found to cancel."}, 404
 
-        # Write the updated list back to the file
-        with open(bookings_file, 'w') as file:
-            json.dump(updated_bookings, file, indent=4)
+        # The seat goes back on sale
+        seats.release(event_id, user_email)
 
         return {"message": "Booking canceled successfully."}, 200
 
@@ -510,53 +1145,47 @@ def cancelRegistration(event_id, user_email, bookings_file='booking.json'):
 @app.route('/cancel_registration', methods=['POST'])
 def cancel_registration():
     event_id = request.json.get('event_id')
-    print("session ",session.get('email'))
     response, status_code = cancelRegistration(event_id, session.get('email'))
     return (response), status_code
 
-def fetch_all_user_events(events_file='events.json', bookings_file='booking.json', users_file='users.json'):
+# Fields left out of the admin listing: credentials, role and the event image
+ALL_USER_EVENTS_EXCLUDED_FIELDS = {"password", "role", "image", "images"}
+
+def project(record, excluded_fields=ALL_USER_EVENTS_EXCLUDED_FIELDS):
+    return {key: value for key, value in record.items() if key not in excluded_fields}
+
+# Projected events by id and bookings by email, the lookups of the join below
+def build_all_user_events_indexes(events, bookings):
+    events_by_id, bookings_by_email = build_booking_indexes(events, bookings)
+    projected_events = {event_id: project(event) for event_id, event in events_by_id.items()}
+    return projected_events, bookings_by_email
+
+# Join users with the events they booked, one compact row per (user, event).
+# Rows are produced one at a time; the join itself is never materialized.
+def iter_all_user_events(users, projected_events, bookings_by_email):
+    for user in itertools.islice(users, len(users)):
+        email = user.get('email')
+        if not isinstance(email, str):
+            continue  # No (usable) email: the user cannot have bookings
+        user_bookings = bookings_by_email.get(email)
+        if not user_bookings:
+            continue
+
+        user_row = project(user)
+        for event in booked_events(user_bookings, projected_events.get):
+            user_event = dict(user_row)
+            user_event.update(event)  # Event fields win, as before
+            yield user_event
+
+def fetch_all_user_events():
     try:
-        # Read events.json file
-        with open(events_file, 'r') as events_file:
-            events = json.load(events_file)
-
-        # Read booking.json file
-        with open(bookings_file, 'r') as bookings_file:
-            bookings = json.load(bookings_file)
-
-        # Read user.json file to get user details
-        with open(users_file, 'r') as users_file:
-            users = json.load(users_file)
-
-        # Initialize an empty list to hold the user events
-        user_events = []
+        # The indexes are rebuilt only when events or bookings change
+        projected_events, bookings_by_email = db.derive(
+            'all_user_events_indexes', ["events", "bookings"], build_all_user_events_indexes
+        )
+        user_events = iter_all_user_events(db.all("users"), projected_events, bookings_by_email)
 
-        # Iterate through all the users
-        for user in users:
-            # Get the user email for the current user
-            user_email = user['email']
-
-            # Find all bookings for the current user where user_email matches booking's user_email
-            user_bookings = [booking for booking in bookings if booking['user_email'] == user_email]
-
-            # Extract event_ids from the user's bookings
-            user_event_ids = {booking['event_id'] for booking in user_bookings}
-
-            # Filter the events to get only the events corresponding to the user's bookings
-            filtered_events = [event for event in events if event['event_id'] in user_event_ids]
-
-            # Merge the user data with the event data into a single object
-            for event in filtered_events:
-                user_event = user.copy()  # Create a copy of the user data to avoid modifying the original
-                user_event.update(event)  # Merge the event data into the user data
-                user_events.append(user_event)  # Add the combined data to the list
-                # user_events.pop("password")
-                # user_events.pop("role")
-                # user_events.pop("image")
-
-
-
-        return user_events, 200  # Return the grouped data and status code
+        return user_events, 200  # Return the rows (a generator) and status code
 
     except FileNotFoundError as e:
         print(e)
@@ -570,57 +1199,121 @@ def fetch_all_user_events(events_file='events.json', bookings_file='booking.json
 # The route handler function should now call the `fetch_all_user_events` function
 @app.route('/get_all_user_events', methods=['GET'])
 def get_all_user_events_handler():
-    user_events, status_code = fetch_all_user_events()  # Call the function that fetches user events
-    return jsonify(user_events), status_code
+    etag = hashlib.sha1(f"{db.etag('users')}:{db.etag('events')}:{db.etag('bookings')}".encode()).hexdigest()
+    response = not_modified(etag)
+    if response is not None:
+        return response
 
-def add_notification_to_file(email, text, file_path='notifications.json'):
+    user_events, status_code = fetch_all_user_events()  # Call the function that fetches user events
+    if status_code != 200:
+        return jsonify(user_events), status_code
     try:
-        # Read the existing data from the file
-        try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-        except FileNotFoundError:
-            # If file doesn't exist, initialize with an empty list
-            data = []
-
-        # Ensure the data in the file is a list
-        if not isinstance(data, list):
-            raise ValueError("The JSON file should contain an array.")
-        # Calculate the index
-        index = len(data)
-
-        notification = {"user_email": email, "notification_id": index+1, "text": text}
+        response = stream_json_array(user_events)
+    except Exception as e:
+        return jsonify({"message": f"An error occurred: {e}"}), 500
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-        # Append the new event to the list
-        data.append(notification)
+def add_notification_to_file(email, text):
+    try:
+        notification = {"user_email": email, "text": text, "created_at": timestamp()}
 
-        # Write the updated data back to the file
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        # Save the notification; storage assigns its notification_id
+        db.insert("notifications", notification)
 
         return {"message": "Notification sent successfully"}, 200
 
     except Exception as e:
         return {"message": f"An error occurred: {e}"}, 500
 
+# Notifications are looked up by recipient, which must be a plain string
+def is_recipient(email):
+    return isinstance(email, str) and email != ""
+
 @app.route('/add_notification', methods=['POST'])
 def add_notification():
     email = request.json.get('email')
     text = request.json.get('text')
-    print("session ",session.get('email'))
+    if not is_recipient(email):
+        return {"message": "email must be a non-empty string."}, 400
     response, status_code = add_notification_to_file(email, text)
     return (response), status_code
 
 
 
-def get_user_notification_from_the_file(user_email, notification_file='notifications.json'):
+# Emails of everyone who booked an event, without duplicates
+def event_attendee_emails(event_id):
+    emails = {}
+    for booking in db.find("bookings", event_id=event_id):
+        if booking.get('user_email'):
+            emails.setdefault(booking['user_email'])
+    return list(emails)
+
+def add_notifications_in_bulk(emails, text, send_email=False):
     try:
-        # Open the notifications file
-        with open(notification_file, 'r') as file:
-            notifications = json.load(file)
+        created_at = timestamp()
+        notifications = [{"user_email": email, "text": text, "created_at": created_at} for email in emails]
+
+        # A single write for all recipients; storage assigns the notification_ids
+        db.insert_many("notifications", notifications)
+
+        # Optionally email the same text to every recipient
+        emails_queued = 0
+        if send_email:
+            for email in emails:
+                try:
+                    email_queue.enqueue(email, "New notification from Event Flow", text)
+                    emails_queued += 1
+                except ValueError:
+                    continue  # Not a deliverable address; the notification is stored all the same
+                except QueueFull:
+                    break
+
+        return {
+            "message": f"Notification sent to {len(notifications)} users",
+            "recipients": len(notifications),
+            "emails_queued": emails_queued
+        }, 200
 
-        # Filter the notifications for the given user_email
-        user_notifications = [notification for notification in notifications if notification['user_email'] == user_email]
+    except Exception as e:
+        return {"message": f"An error occurred: {e}"}, 500
+
+@app.route('/add_notifications_bulk', methods=['POST'])
+def add_notifications_bulk():
+    """Notify every booker of an event (or a list of emails) in one request."""
+    text = request.json.get('text')
+    event_id = request.json.get('event_id')
+    emails = request.json.get('emails')
+
+    if not text:
+        return {"message": "Missing notification text."}, 400
+    if event_id is not None:
+        try:
+            event_id = int(event_id)
+        except (ValueError, TypeError):
+            return {"message": "event_id must be a number."}, 400
+        emails = event_attendee_emails(event_id)
+    elif not isinstance(emails, list):
+        return {"message": "Provide an event_id or a list of emails."}, 400
+    elif not all(is_recipient(email) for email in emails):
+        return {"message": "Every entry of emails must be a non-empty string."}, 400
+
+    response, status_code = add_notifications_in_bulk(emails, text, bool(request.json.get('send_email')))
+    return (response), status_code
+
+# Notifications of a user newer than ``since``; the per-user list is in
+# notification_id order, so the start is found by bisection
+def notifications_since(user_notifications, since):
+    if not since:
+        return user_notifications
+    start = bisect.bisect_right(user_notifications, since, key=lambda notification: notification['notification_id'])
+    return user_notifications[start:]
+
+def get_user_notification_from_the_file(user_email, since=None):
+    try:
+        # Look up the notifications for the given user_email
+        user_notifications = notifications_since(db.find("notifications", user_email=user_email), since)
 
         return user_notifications, 200  # Return notifications and status code
 
@@ -631,37 +1324,146 @@ def get_user_notification_from_the_file(user_email, notification_file='notificat
     except Exception as e:
         return {"message": f"An error occurred: {e}"}, 500
     
+# Longest a long-poll request may wait for new notifications
+MAX_NOTIFICATION_WAIT = 30
+
+# Wait for notifications newer than ``since``; returns [] on timeout
+def wait_for_notifications(user_email, since, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        version = db.version("notifications")
+        notifications, status_code = get_user_notification_from_the_file(user_email, since)
+        remaining = deadline - time.monotonic()
+        if status_code != 200 or notifications or remaining <= 0:
+            return notifications, status_code
+        db.wait_for_change("notifications", version, remaining)
+
+@app.route('/history', methods=['GET'])
+def history():
+    """Archived events in a date range, with the user's archived bookings and notifications.
+
+    Query parameters from and to ("YYYY-MM-DD") select the months read from
+    the archive; without them every month is read. The live collections are
+    not touched: current events come from /get_events.
+    """
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    if any(bound and partition_of(bound) != bound[:7] for bound in (date_from, date_to)):
+        return {"message": "from and to must be dates (YYYY-MM-DD)."}, 400
+    try:
+        months = archive.partitions(date_from and date_from[:7], date_to and date_to[:7])
+        events = [
+            event for month in months for event in archive.read("events", month)
+            if in_date_range(event, date_from, date_to)
+        ]
+        result = {"events": events}
+        user_email = session.get('email')
+        if user_email:
+            shown = {event["event_id"] for event in events}
+            result["bookings"] = [
+                booking for month in months for booking in archive.read("bookings", month)
+                if booking.get("user_email") == user_email and booking.get("event_id") in shown
+            ]
+            result["notifications"] = [
+                notification for month in months for notification in archive.read("notifications", month)
+                if notification.get("user_email") == user_email
+            ]
+        response = jsonify(result)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+    except Exception as e:
+        return jsonify({"message": f"An error occurred: {e}"}), 500
+
 @app.route('/get_user_notifications', methods=['GET'])
 def get_user_notifications():
+    """Notifications of the logged-in user.
+
+    since=<notification_id> returns only newer ones; wait=<seconds> turns
+    the request into a long poll that returns as soon as one arrives.
+    """
     user_email = session.get('email')
+    since = request.args.get('since', type=int)
+    wait = min(request.args.get('wait', 0, type=float), MAX_NOTIFICATION_WAIT)
 
-    notifications, status_code = get_user_notification_from_the_file(user_email)  # This will now work properly
+    if wait > 0:
+        notifications, status_code = wait_for_notifications(user_email, since, wait)
+    else:
+        notifications, status_code = get_user_notification_from_the_file(user_email, since)  # This will now work properly
     return jsonify(notifications), status_code
 
+@app.route('/stream_user_notifications', methods=['GET'])
+def stream_user_notifications():
+    """Server-Sent Events stream of the logged-in user's new notifications."""
+    user_email = session.get('email')
+    if not user_email:
+        return {"message": "User not logged in."}, 401
+
+    # EventSource sends the last id it saw when it reconnects
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+
+    def events(since):
+        yield "retry: 3000\n\n"
+        while True:
+            notifications, status_code = wait_for_notifications(user_email, since, MAX_NOTIFICATION_WAIT)
+            if status_code != 200:
+                return
+            if not notifications:
+                yield ": keep-alive\n\n"
+                continue
+            for notification in notifications:
+                yield f"id: {notification['notification_id']}\ndata: {app.json.dumps(notification)}\n\n"
+            since = notifications[-1]['notification_id']
+
+    response = app.response_class(stream_with_context(events(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return response
+
+# Pages that render the same HTML for everyone are rendered once and served
+# precompressed with an ETag; their scripts are fingerprinted static files
+assets = StaticAssets(os.path.join(app.root_path, 'static'))
+app.jinja_env.globals['asset_url'] = lambda path: url_for('asset', name=assets.fingerprinted(path))
+pages = PageCache(render_template)
+
+def cached_page(template):
+    if app.jinja_env.auto_reload:
+        return render_template(template)  # Debug mode: show template and script edits at once
+    return pages.get(template).response(request.headers, 'no-cache')  # Revalidated, usually a 304
+
+@app.route('/assets/<path:name>')
+def asset(name):
+    """Serve a fingerprinted static file, cacheable forever."""
+    static_file = assets.get(name)
+    if static_file is None:
+        abort(404)
+    body, status, headers = static_file.response(request.headers, f'public, max-age={ASSET_MAX_AGE}, immutable')
+    headers['X-Content-Type-Options'] = 'nosniff'
+    return body, status, headers
+
 @app.route('/about')
 def about():
     """Render the booking page."""
-    return render_template('about.html')
+    return cached_page('about.html')
 
 @app.route('/event')
 def event():
     """Render the booking page."""
-    return render_template('event.html')
+    return cached_page('event.html')
 
 @app.route('/my_event')
 def my_event():
     """Render the booking page."""
-    return render_template('my_event.html')
+    return cached_page('my_event.html')
 
 @app.route('/contact')
 def contact():
     """Render the booking page."""
-    return render_template('contact.html')
+    return cached_page('contact.html')
 
 @app.route('/booking')
 def booking():
     """Render the booking page."""
-    return render_template('booking.html')
+    return cached_page('booking.html')
 @app.route('/viewbook')
 def viewbooking():
     """Render the viewbooking page."""
@@ -669,7 +1471,7 @@ def viewbooking():
 @app.route('/payment')
 def payment():
     """Render the payment page."""
-    return render_template('payment.html')
+    return cached_page('payment.html')
 
 @app.route('/notifications')
 def notifications():
@@ -679,7 +1481,7 @@ def notifications():
 @app.route('/admin_event')
 def admin_event():
     """Render the notifications page."""
-    return render_template('admin_event.html')
+    return cached_page('admin_event.html')
 
 @app.route('/admin_index')
 def admin_index():
@@ -689,16 +1491,154 @@ def admin_index():
 @app.route('/add_event_admin')
 def add_event_admin():
     """Render the notifications page."""
-    return render_template('add_event_admin.html')
+    return cached_page('add_event_admin.html')
 
 @app.route('/create_notification')
 def create_notification():
     """Render the notifications page."""
     return render_template('create_notification.html')
 
+@app.cli.command('compact-data')
+def compact_data_command():
+    """Fold the write-ahead logs back into the main data files."""
+    db.compact()
+    print("Compacted write-ahead logs.")
+
+
+@app.cli.command('archive')
+@click.option('--before', help='Archive events dated before this day (YYYY-MM-DD), default today.')
+def archive_command(before):
+    """Move past events, their bookings and old notifications to the archive."""
+    today = datetime.now()
+    before = before or today.date().isoformat()
+    notifications_before = (today - timedelta(days=NOTIFICATION_RETENTION_DAYS)).date().isoformat()
+    moved = archive_data(db, archive, before, notifications_before, seats)
+    print(
+        f"Archived {moved['events']} event(s), {moved['bookings']} booking(s) and "
+        f"{moved['notifications']} notification(s) to {ARCHIVE_DIR}."
+    )
+
+@app.cli.command('rebuild-seats')
+def rebuild_seats_command():
+    """Recompute the seat inventory from the stored bookings."""
+    # Archived bookings count only per booking day
+    count = seats.rebuild(db.all("bookings"), archive.all("bookings"))
+    print(f"Rebuilt seat counts of {count} event(s) in {SEATS_DIR}.")
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recount the admin statistics from the stored bookings, report drift and rebuild."""
+    # The seat logs keep counting archived bookings per day
+    live_bookings, archived = db.all("bookings"), archive.all("bookings")
+    bookings = list(live_bookings) + archived
+    events = db.all("events")
+    live = booking_stats(events, *seats.summary([event["event_id"] for event in events]))
+    recounted = booking_stats(events, *count_bookings(bookings))
+    mismatches = 0
+    for before, after in zip(live["events"], recounted["events"]):
+        if before != after:
+            mismatches += 1
+            print(f"Event {after['event_id']}: live {before['by_tier']}, bookings {after['by_tier']}")
+    if live["bookings_by_day"] != recounted["bookings_by_day"]:
+        mismatches += 1
+        print("Bookings per day differ from the stored bookings.")
+    count = seats.rebuild(live_bookings, archived)
+    print(f"{mismatches} mismatch(es) found; rebuilt statistics of {count} event(s) from {len(bookings)} booking(s).")
+
+@app.cli.command('import-json')
+def import_json_command():
+    """Import the JSON data files into the SQLite database."""
+    imported = import_json_files(SqliteStorage(SQLITE_DB), DATA_FILES)
+    for collection, count in imported.items():
+        print(f"Imported {count} {collection} into {SQLITE_DB}.")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, storage and SMTP metrics in the Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Report storage statistics, e.g. hit/miss counters of the data file cache."""
+    return jsonify(db.stats()), 200
+
+@app.route('/thumbnails', methods=['GET'])
+def thumbnail_stats():
+    """Report the image resizing pool: whether Pillow is installed, pending, completed and failed jobs."""
+    return jsonify(thumbnails.stats()), 200
+
+@app.route('/page_cache', methods=['GET'])
+def page_cache_stats():
+    """Report the cached pages and compressed JSON responses, with their hit counts."""
+    return jsonify({"pages": pages.stats(), "json": json_bodies.stats()}), 200
+
+# Bookings and revenue per event and tier, from the per-tier seat counts ``sold``
+def booking_stats(events, sold, by_day):
+    stats = []
+    revenue = {tier: 0.0 for tier in TIERS}
+    for event in events:
+        event_sold = {tier: count for tier, count in sold.get(event["event_id"], {}).items() if count}
+        event_revenue = 0.0
+        for tier, count in event_sold.items():
+            try:
+                amount = float(event.get(PRICE_FIELDS.get(tier)) or 0) * count
+            except (TypeError, ValueError):
+                amount = 0.0  # No valid price: free
+            revenue[tier] = revenue.get(tier, 0.0) + amount
+            event_revenue += amount
+        stats.append({
+            "event_id": event["event_id"],
+            "title": event.get("title"),
+            "bookings": sum(event_sold.values()),
+            "by_tier": event_sold,
+            "revenue": round(event_revenue, 2),
+        })
+    return {
+        "events": stats,
+        "total_bookings": sum(event["bookings"] for event in stats),
+        "revenue": {tier: round(amount, 2) for tier, amount in revenue.items()},
+        "total_revenue": round(sum(revenue.values()), 2),
+        # Bookings made before booking days were recorded are not in here
+        "bookings_by_day": [{"day": day, "bookings": count} for day, count in sorted(by_day.items())],
+    }
+
+@app.route('/admin/stats', methods=['GET'])
+def admin_stats():
+    """Bookings per event, revenue per tier and bookings per day, for the admin dashboard."""
+    if session.get('role') != 'admin':
+        return jsonify({"message": "Admins only."}), 403
+    try:
+        events = db.all("events")
+        # The seat inventory keeps these counts up to date on every booking and
+        # cancellation, so no booking is read here
+        sold, by_day = seats.summary([event["event_id"] for event in events])
+        response = jsonify(booking_stats(events, sold, by_day))
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response, 200
+    except Exception as e:
+        return jsonify({"message": f"An error occurred: {e}"}), 500
+
+@app.route('/booking_queue', methods=['GET'])
+def booking_queue_stats():
+    """Report the booking waiting room: depth, capacity, service rate and rejections."""
+    return jsonify({
+        "depth": waiting_room.depth(),
+        "capacity": waiting_room.capacity,
+        "rate": waiting_room.rate,
+        "rejected": waiting_room.rejected,
+    }), 200
+
+@app.route('/password_hasher', methods=['GET'])
+def password_hasher_stats():
+    """Report the password hashing pool: workers, queue bound, completed and rejected jobs."""
+    return jsonify(passwords.stats()), 200
+
 @app.route('/generate_pwd')
 def generate_pwd():
-    return generate_password_hash(request.args.get('password'))
+    try:
+        return passwords.hash(request.args.get('password'))
+    except HasherBusy as e:
+        return jsonify({"message": str(e)}), 429
 
 if __name__ == '__main__':
     app.run(debug=True)
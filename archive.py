@@ -0,0 +1,171 @@
+"""Cold storage for past events, their bookings and old notifications.
+
+events.json, booking.json and notifications.json only ever grew, so every
+listing loaded, scanned and sent events that were long over. ``archive_data``
+moves the events dated before a cutoff, with their bookings, and the
+notifications older than a retention period out of the live collections into
+JSON files partitioned by month::
+
+    archive/2025-03/events.json         events dated March 2025
+    archive/2025-03/bookings.json       bookings of those events
+    archive/2025-03/notifications.json  notifications created in March 2025
+
+The request handlers never open these files except to answer a history
+query, which reads only the months it asks for.
+
+Records are written to their partition before they leave the live
+collection, and a partition skips the records it already holds, so a run
+that was interrupted half way is simply run again.
+"""
+import json
+import os
+import re
+
+from storage import FileLock, dump_json, max_id, parse_json, read_file, replace_file
+
+PARTITION_RE = re.compile(r'^\d{4}-\d{2}$')
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+UNDATED = "undated"  # Partition of records without a usable date
+
+
+def partition_of(date):
+    # "YYYY-MM" of a "YYYY-MM-DD..." date, UNDATED if there is none
+    if isinstance(date, str) and DATE_RE.match(date):
+        return date[:7]
+    return UNDATED
+
+
+def dated_before(date, cutoff):
+    # True if ``date`` is a "YYYY-MM-DD..." date before the day ``cutoff``
+    return isinstance(date, str) and DATE_RE.match(date) is not None and date[:10] < cutoff
+
+
+def event_id_of(record):
+    try:
+        return int(record.get("event_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def group_by(records, partition):
+    groups = {}
+    for record in records:
+        groups.setdefault(partition(record), []).append(record)
+    return groups
+
+
+class Archive:
+    """Archived records in ``root/<YYYY-MM>/<collection>.json`` files."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_of(self, partition, collection):
+        return os.path.join(self.root, partition, f"{collection}.json")
+
+    def partitions(self, first=None, last=None):
+        """Months (``"YYYY-MM"``) from ``first`` to ``last`` that have files, oldest first.
+
+        Without bounds the undated partition comes last.
+        """
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        found = [
+            name for name in sorted(names)
+            if PARTITION_RE.match(name) and (first is None or name >= first) and (last is None or name <= last)
+        ]
+        if first is None and last is None and UNDATED in names:
+            found.append(UNDATED)
+        return found
+
+    def read(self, collection, partition):
+        """The archived records of ``collection`` in ``partition``; read from disk on every call."""
+        path = self.path_of(partition, collection)
+        try:
+            return parse_json(path, read_file(path))
+        except FileNotFoundError:
+            return []
+
+    def all(self, collection):
+        """Every archived record of ``collection``; for rebuilds, not for requests."""
+        return [record for partition in self.partitions() for record in self.read(collection, partition)]
+
+    def add(self, collection, groups):
+        """Append ``{partition: records}`` to the partitions of ``collection``; returns how many were new."""
+        added = 0
+        for partition, records in groups.items():
+            path = self.path_of(partition, collection)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with FileLock(path + '.lock'):
+                existing = self.read(collection, partition)
+                # Whole records, not ids: old data has bookings sharing an id
+                held = {json.dumps(record, sort_keys=True) for record in existing}
+                new = [record for record in records if json.dumps(record, sort_keys=True) not in held]
+                if new:
+                    replace_file(path, dump_json(path, existing + new))
+                    added += len(new)
+        return added
+
+
+def archived_partitions(archive, event_ids):
+    # Partition of each of ``event_ids`` that an earlier run archived
+    found = {}
+    if not event_ids:
+        return found
+    for partition in archive.partitions():
+        for event in archive.read("events", partition):
+            if event_id_of(event) in event_ids:
+                found.setdefault(event_id_of(event), partition)
+    return found
+
+
+def archive_data(db, archive, before, notifications_before, seats=None):
+    """Move past data from the live collections of ``db`` to ``archive``.
+
+    Events dated before ``before`` go with their bookings, notifications
+    created before ``notifications_before`` (both "YYYY-MM-DD") on their own;
+    notifications from before creation dates were recorded count as old.
+    The id counters are moved past the archived ids first, so new records
+    never reuse them, and the moved events are dropped from the seat
+    inventory ``seats``. Returns the number of records moved per collection.
+    """
+    moved = {}
+
+    events = [event for event in db.all("events") if dated_before(event.get("date"), before)]
+    partitions = {event["event_id"]: partition_of(event.get("date")) for event in events}
+    archive.add("events", group_by(events, lambda event: partitions[event["event_id"]]))
+    db.reserve_ids("events", max_id(events, "event_id"))
+    moved["events"] = db.delete_where("events", lambda event: event.get("event_id") in partitions)
+
+    # Bookings after events: once an event left the live list nobody can book
+    # it. A booking that was being made meanwhile, or whose event is gone for
+    # any other reason, is moved too: to its event's month if an earlier run
+    # archived the event (e.g. one interrupted before the bookings), undated
+    # if the event is unknown.
+    live = {event["event_id"] for event in db.all("events")}
+    bookings = [booking for booking in db.all("bookings") if event_id_of(booking) not in live]
+    event_ids = {event_id_of(booking) for booking in bookings} - {None}
+    months = archived_partitions(archive, event_ids - set(partitions))
+    months.update(partitions)
+    archive.add("bookings", group_by(bookings, lambda booking: months.get(event_id_of(booking), UNDATED)))
+    db.reserve_ids("bookings", max_id(bookings, "booking_id"))
+    booking_ids = {booking.get("booking_id") for booking in bookings}
+    moved["bookings"] = db.delete_where(
+        "bookings", lambda booking: booking.get("booking_id") in booking_ids and event_id_of(booking) not in live
+    )
+    if seats is not None:
+        seats.forget(set(partitions) | event_ids)
+
+    notifications = [
+        notification for notification in db.all("notifications")
+        if not notification.get("created_at") or dated_before(notification["created_at"], notifications_before)
+    ]
+    archive.add("notifications", group_by(notifications, lambda notification: partition_of(notification.get("created_at"))))
+    db.reserve_ids("notifications", max_id(notifications, "notification_id"))
+    notification_ids = {notification.get("notification_id") for notification in notifications}
+    moved["notifications"] = db.delete_where(
+        "notifications", lambda notification: notification.get("notification_id") in notification_ids
+    )
+    return moved
@@ -0,0 +1,88 @@
+"""Load and dump time and file size of events.json in each JSON encoding.
+
+Generates an events.json with ``--scale`` options like generate_data.py, then
+times parsing and serializing it ``--repeat`` times (median) with:
+
+* ``stdlib-indent4``: ``json.dumps(indent=4)``, the old data file format;
+* ``stdlib-compact``: ``json.dumps`` without whitespace, the fallback;
+* ``orjson-compact``: orjson, the default when it is installed;
+* ``orjson-indent2``: orjson with ``JSON_PRETTY=1``.
+
+Encodings whose package is missing are skipped. Sizes are of the file as
+written, and of its gzip, which is roughly what indentation costs over HTTP.
+
+    python benchmarks/codec.py --events 10000 --images
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from generate_data import add_arguments, generate, sizes
+from run_routes import git_commit
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encodings():
+    """Name -> (dump(data) -> bytes, load(bytes) -> data)."""
+    found = {
+        "stdlib-indent4": (lambda data: json.dumps(data, indent=4).encode(), json.loads),
+        "stdlib-compact": (lambda data: json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode(), json.loads),
+    }
+    if orjson is not None:
+        found["orjson-compact"] = (orjson.dumps, orjson.loads)
+        found["orjson-indent2"] = (lambda data: orjson.dumps(data, option=orjson.OPT_INDENT_2), orjson.loads)
+    return found
+
+
+def median_ms(function, argument, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    counts = sizes(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        generate(tmp, images=args.images, image_kb=args.image_kb, seed=args.seed, **dict(counts, users=0, bookings=0, notifications=0))
+        with open(os.path.join(tmp, "events.json"), 'rb') as file:
+            events = json.loads(file.read())
+
+    report = {"commit": git_commit(), "events": len(events), "images": args.images, "encodings": {}}
+    for name, (dump, load) in encodings().items():
+        raw = dump(events)
+        report["encodings"][name] = {
+            "dump_ms": median_ms(dump, events, args.repeat),
+            "load_ms": median_ms(load, raw, args.repeat),
+            "bytes": len(raw),
+            "gzip_bytes": len(gzip.compress(raw, 6)),
+        }
+        print(f"{name} done", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Generate synthetic data files for benchmarks.
+
+Writes users.json, events.json, booking.json and notifications.json in the
+same shape the app uses, at any scale. Every user's password is
+``PASSWORD``; the same hash is reused for all of them, since hashing a
+million passwords would take hours.
+
+    python benchmarks/generate_data.py /tmp/bench-data --scale 100000 --images
+"""
+import argparse
+import base64
+import json
+import os
+import random
+
+from werkzeug.security import generate_password_hash
+
+PASSWORD = "password"
+
+
+def user_name(index):
+    return f"user{index}"
+
+
+def user_email(index):
+    return f"user{index}@example.com"
+
+
+def fake_image(rng, size_kb):
+    # Random bytes behind a JPEG header: the size is what matters, not the picture
+    raw = b"\xff\xd8\xff\xe0" + rng.randbytes(size_kb * 1024)
+    return "data:image/jpeg;base64," + base64.b64encode(raw).decode()
+
+
+def generate(directory, users, events, bookings, notifications, images=False, image_kb=64, seed=0):
+    """Write the four data files into ``directory``; returns the row counts."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    password_hash = generate_password_hash(PASSWORD)
+
+    user_rows = [{"username": "admin", "password": password_hash, "email": "admin@example.com", "role": "admin"}]
+    user_rows += [
+        {"username": user_name(i), "password": password_hash, "email": user_email(i), "role": "user"}
+        for i in range(users)
+    ]
+
+    event_rows = []
+    for event_id in range(1, events + 1):
+        event = {
+            "title": f"Event {event_id}",
+            "description": " ".join(rng.choice(("music", "talk", "workshop", "meetup", "concert")) for _ in range(8)),
+            "amountStandard": str(rng.randint(10, 100)),
+            "amountPremium": str(rng.randint(100, 500)),
+            "amountDeluxe": str(rng.randint(500, 2000)),
+            "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "time": f"{rng.randint(0, 23):02d}:{rng.choice((0, 15, 30, 45)):02d}",
+            "event_id": event_id,
+        }
+        if images:
+            event["image"] = fake_image(rng, image_kb)
+        event_rows.append(event)
+
+    booking_rows = [
+        {"event_id": rng.randint(1, max(events, 1)), "booking_id": booking_id, "user_email": user_email(rng.randrange(max(users, 1)))}
+        for booking_id in range(1, bookings + 1)
+    ]
+    notification_rows = [
+        {"user_email": user_email(rng.randrange(max(users, 1))), "notification_id": notification_id, "text": f"Reminder {notification_id}"}
+        for notification_id in range(1, notifications + 1)
+    ]
+
+    for name, rows in (("users.json", user_rows), ("events.json", event_rows),
+                       ("booking.json", booking_rows), ("notifications.json", notification_rows)):
+        with open(os.path.join(directory, name), 'w') as file:
+            json.dump(rows, file)
+
+    return {"users": len(user_rows), "events": events, "bookings": bookings, "notifications": notifications}
+
+
+def add_arguments(parser):
+    """Data size options, shared with run_routes.py."""
+    parser.add_argument("--scale", type=int, default=1000, help="rows per collection (events get a tenth)")
+    parser.add_argument("--users", type=int, help="override the number of users")
+    parser.add_argument("--events", type=int, help="override the number of events")
+    parser.add_argument("--bookings", type=int, help="override the number of bookings")
+    parser.add_argument("--notifications", type=int, help="override the number of notifications")
+    parser.add_argument("--images", action="store_true", help="give every event an inline base64 image")
+    parser.add_argument("--image-kb", type=int, default=64, help="size of each inline image")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def sizes(args):
+    """Row counts selected by the options of add_arguments()."""
+    return {
+        "users": args.users if args.users is not None else args.scale,
+        "events": args.events if args.events is not None else max(args.scale // 10, 1),
+        "bookings": args.bookings if args.bookings is not None else args.scale,
+        "notifications": args.notifications if args.notifications is not None else args.scale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    add_arguments(parser)
+    args = parser.parse_args()
+    counts = generate(args.directory, images=args.images, image_kb=args.image_kb, seed=args.seed, **sizes(args))
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Logins per second against the number of password hashing processes.
+
+Starts ``--threads`` request threads that check a password as fast as they
+can for ``--duration`` seconds, first inline in the threads (the old
+behaviour) and then through a PasswordHasher with 1, 2, ... ``--max-workers``
+processes. Rejected attempts are counted separately; they are what a client
+would see as a 429.
+
+    python benchmarks/login_throughput.py --max-workers 8 --duration 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+from hasher import HasherBusy, PasswordHasher  # noqa: E402
+
+
+def run(check, threads, duration):
+    """Call ``check()`` from ``threads`` threads for ``duration`` seconds; return (ok, rejected)."""
+    counts = {"ok": 0, "rejected": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        ok = rejected = 0
+        while time.perf_counter() < deadline:
+            try:
+                check()
+                ok += 1
+            except HasherBusy:
+                rejected += 1
+                time.sleep(0.001)  # A real client would back off before retrying
+        with lock:
+            counts["ok"] += ok
+            counts["rejected"] += rejected
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts["ok"], counts["rejected"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=32, help="concurrent login requests")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per measurement")
+    args = parser.parse_args()
+
+    password_hash = generate_password_hash("secret")
+    print(f"{'workers':>8} {'logins/s':>10} {'rejected/s':>11}")
+
+    ok, _ = run(lambda: check_password_hash(password_hash, "secret"), args.threads, args.duration)
+    print(f"{'inline':>8} {ok / args.duration:>10.1f} {0:>11.1f}")
+
+    for workers in range(1, args.max_workers + 1):
+        hasher = PasswordHasher(workers=workers)
+        hasher.check(password_hash, "secret")  # Start the processes before measuring
+        ok, rejected = run(lambda: hasher.check(password_hash, "secret"), args.threads, args.duration)
+        hasher.shutdown()
+        print(f"{workers:>8} {ok / args.duration:>10.1f} {rejected / args.duration:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
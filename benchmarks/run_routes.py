@@ -0,0 +1,351 @@
+"""Latency, throughput and memory of every JSON route.
+
+Generates a data set (see generate_data.py) and drives the routes twice:
+
+* ``client``: in-process through Flask's test client, one request at a time,
+  which measures the handlers themselves;
+* ``http``: against the app served by a local threaded server in its own
+  process, from ``--concurrency`` client threads each holding a logged-in
+  session.
+
+Each phase starts from a fresh copy of the data. The report is JSON with
+p50/p95/p99/mean latency (ms), throughput (requests/s) and error count per
+route, plus the peak RSS of the process serving the requests, so results of
+two commits can be diffed:
+
+    python benchmarks/run_routes.py --scale 10000 --output before.json
+"""
+import argparse
+import contextlib
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from generate_data import PASSWORD, add_arguments, generate, sizes, user_name
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every session books many events back to back: lift the booking admission
+# limits (unless set) so the report measures the handlers, not the throttling
+BOOKING_LIMITS = {"BOOKING_USER_RATE": "1000000", "BOOKING_USER_BURST": "1000000", "BOOKING_RATE": "1000000"}
+
+
+class Session:
+    """A logged-in user as seen by the route specs below."""
+
+    def __init__(self, index, events, seed):
+        self.username = user_name(index)
+        self.events = events
+        self.rng = random.Random(seed + index)
+        self.booked = []  # Event ids booked by this session, cancelled again later
+
+
+def login(session):
+    return "POST", "/login", {"form": {"username": session.username, "password": PASSWORD}}
+
+
+def book_event(session):
+    # A cancellation removes every booking of that event, so book each one once
+    event_id = session.rng.randint(1, session.events)
+    while event_id in session.booked and len(session.booked) < session.events:
+        event_id = session.rng.randint(1, session.events)
+    session.booked.append(event_id)
+    return "POST", "/book_event", {"json_body": {"event_id": event_id}}
+
+
+def cancel_registration(session):
+    event_id = session.booked.pop() if session.booked else 0
+    return "POST", "/cancel_registration", {"json_body": {"event_id": event_id}}
+
+
+# Route name -> function building (method, path, body) for the next request;
+# in this order, so every cancellation finds a booking made just before
+ROUTES = [
+    ("login", login),
+    ("get_events", lambda session: ("GET", "/get_events", {})),
+    ("book_event", book_event),
+    ("get_all_user_events", lambda session: ("GET", "/get_all_user_events", {})),
+    ("cancel_registration", cancel_registration),
+    ("get_user_notifications", lambda session: ("GET", "/get_user_notifications", {})),
+]
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.client.open(path, method=method, data=form, json=json_body)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Report the 302 after a login instead of fetching the page behind it
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect
+        )
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {}
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def drive(transports, sessions, requests):
+    """Send ``requests`` requests per route, split over the sessions, one thread each."""
+    for transport, session in zip(transports, sessions):
+        method, path, body = login(session)
+        transport.request(method, path, **body)
+
+    results = {}
+    for name, build in ROUTES:
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        share = max(requests // len(sessions), 1)
+
+        def worker(transport, session):
+            mine = []
+            failed = 0
+            for _ in range(share):
+                method, path, body = build(session)
+                start = time.perf_counter()
+                status = transport.request(method, path, **body)
+                mine.append(time.perf_counter() - start)
+                if status >= 400:
+                    failed += 1
+            with lock:
+                latencies.extend(mine)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=pair) for pair in zip(transports, sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[name] = summarize(latencies, errors[0], time.perf_counter() - start)
+    return results
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def process_status_kb(pid, field):
+    # Linux only: memory figures from /proc/<pid>/status
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def process_peak_rss_kb(pid):
+    return process_status_kb(pid, "VmHWM")
+
+
+def run_client_phase(args, counts):
+    """Runs inside a child process whose working directory holds the data."""
+    sys.path.insert(0, REPO_ROOT)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from app import app, passwords
+
+        sessions = [Session(index, counts["events"], args.seed) for index in range(args.client_sessions)]
+        transports = [TestClientTransport(app) for _ in sessions]
+        routes = drive(transports, sessions, args.requests)
+        passwords.shutdown()
+    return {"routes": routes, "peak_rss_kb": peak_rss_kb()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+SERVER = """
+import logging, sys
+sys.path.insert(0, {root!r})
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+from werkzeug.serving import run_simple
+from app import app
+run_simple('127.0.0.1', {port}, app, threaded=True)
+"""
+
+
+@contextlib.contextmanager
+def local_server(data_dir):
+    """Serve the app from ``data_dir`` in a child process; yields (base_url, process)."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER.format(root=REPO_ROOT, port=port)],
+        cwd=data_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,  # Its own process group, shared with the pool workers it forks
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(base_url + "/get_events?limit=1").read()
+                break
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("Benchmark server did not start.")
+                time.sleep(0.1)
+        yield base_url, server
+    finally:
+        stop_server(server)
+
+
+def stop_server(server, timeout=30):
+    """Stop the server and every process it started.
+
+    SIGINT makes run_simple return, so the interpreter exits normally and the
+    password hashing and thumbnail pools shut their workers down; SIGTERM
+    would kill the server alone and leave the workers behind.
+    """
+    server.send_signal(signal.SIGINT)
+    deadline = time.time() + timeout
+    while True:
+        server.poll()  # Reap the server, or it stays in the group as a zombie
+        try:
+            os.killpg(server.pid, 0)  # Anyone left in the group?
+        except ProcessLookupError:
+            return
+        if time.time() > deadline:
+            os.killpg(server.pid, signal.SIGKILL)
+        time.sleep(0.1)
+
+
+def run_http_phase(args, counts, data_dir):
+    with local_server(data_dir) as (base_url, server):
+        sessions = [Session(index, counts["events"], args.seed) for index in range(args.concurrency)]
+        transports = [HttpTransport(base_url) for _ in sessions]
+        routes = drive(transports, sessions, args.requests)
+        return {"routes": routes, "concurrency": args.concurrency, "peak_rss_kb": process_peak_rss_kb(server.pid)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads in the http phase")
+    parser.add_argument("--client-sessions", type=int, default=4, help="logged-in users in the client phase")
+    parser.add_argument("--phases", default="client,http", help="comma separated: client, http")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    counts = sizes(args)
+    for name, value in BOOKING_LIMITS.items():
+        os.environ.setdefault(name, value)  # Inherited by the client phase and the server
+
+    if args.child:
+        print(json.dumps(run_client_phase(args, counts)))
+        return
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "storage_backend": os.getenv("STORAGE_BACKEND", "json"),
+        "storage_mode": os.getenv("STORAGE_MODE", "snapshot"),
+        "data": dict(counts, images=args.images, image_kb=args.image_kb if args.images else 0),
+        "requests_per_route": args.requests,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for phase in args.phases.split(","):
+            data_dir = os.path.join(tmp, phase)
+            generate(data_dir, images=args.images, image_kb=args.image_kb, seed=args.seed, **counts)
+            if phase == "client":
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child"] + sys.argv[1:],
+                    cwd=data_dir, capture_output=True, text=True, check=True,
+                )
+                report["client"] = json.loads(child.stdout)
+            elif phase == "http":
+                report["http"] = run_http_phase(args, counts, data_dir)
+            else:
+                parser.error(f"Unknown phase: {phase}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
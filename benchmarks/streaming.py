@@ -0,0 +1,130 @@
+"""Time to first byte and memory of the large listings, across data sizes.
+
+For each ``--scales`` value a data set is generated and served by a local
+server (see run_routes.py). After one warm-up request, which loads the data
+files into the server's cache, each route is fetched ``--requests`` times,
+once without Accept-Encoding and once as a browser would, with
+``Accept-Encoding: gzip``. The report gives, per scale, route and encoding:
+
+* ``ttfb_ms``: median time until the first byte of the body arrived;
+* ``total_ms``: median time until the last byte arrived;
+* ``bytes``: size of the response (compressed for gzip);
+* ``request_peak_kb``: how far the server's peak RSS rose above its resting
+  RSS while serving the requests, i.e. the memory a response costs on top of
+  the cached data (Linux only, needs /proc/<pid>/clear_refs).
+
+For gzip the first request compresses the stream as it is sent and later ones
+may be served from the compressed-response cache, so that first request is
+reported on its own as ``first_ttfb_ms``, ``first_total_ms`` and
+``first_peak_kb``.
+
+With streamed responses ttfb_ms and request_peak_kb (and first_peak_kb)
+should stay flat as the scale grows; only total_ms follows the size of the
+data.
+
+    python benchmarks/streaming.py --scales 1000,10000,100000 --images
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from generate_data import add_arguments, generate, sizes
+from run_routes import git_commit, local_server, process_status_kb
+
+ROUTES = ["/get_events", "/get_all_user_events"]
+ENCODINGS = ["identity", "gzip"]
+
+
+def fetch(base_url, path, encoding="identity"):
+    """Return (seconds to first body byte, seconds to last byte, body size)."""
+    url = urllib.parse.urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port)
+    start = time.perf_counter()
+    conn.request("GET", path, headers={} if encoding == "identity" else {"Accept-Encoding": encoding})
+    response = conn.getresponse()
+    first = response.read(1)
+    ttfb = time.perf_counter() - start
+    size = len(first) + len(response.read())
+    total = time.perf_counter() - start
+    conn.close()
+    return ttfb, total, size
+
+
+def reset_peak_rss(pid):
+    # Writing 5 to clear_refs resets VmHWM to the current RSS
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure(base_url, server, path, requests, encoding):
+    report = {}
+    if encoding == "identity":
+        fetch(base_url, path)  # Warm up the data file cache
+    else:
+        # The first compressed response is made while streaming; report it apart
+        can_reset = reset_peak_rss(server.pid)
+        resting = process_status_kb(server.pid, "VmRSS")
+        first = fetch(base_url, path, encoding)
+        peak = process_status_kb(server.pid, "VmHWM")
+        report = {
+            "first_ttfb_ms": round(first[0] * 1000, 3),
+            "first_total_ms": round(first[1] * 1000, 3),
+            "first_peak_kb": peak - resting if can_reset and peak is not None and resting is not None else None,
+        }
+    can_reset = reset_peak_rss(server.pid)
+    resting = process_status_kb(server.pid, "VmRSS")
+    samples = [fetch(base_url, path, encoding) for _ in range(requests)]
+    peak = process_status_kb(server.pid, "VmHWM")
+    return dict(report, **{
+        "ttfb_ms": round(statistics.median(sample[0] for sample in samples) * 1000, 3),
+        "total_ms": round(statistics.median(sample[1] for sample in samples) * 1000, 3),
+        "bytes": samples[0][2],
+        "request_peak_kb": peak - resting if can_reset and peak is not None and resting is not None else None,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--scales", default="1000,10000,100000", help="comma separated --scale values")
+    parser.add_argument("--requests", type=int, default=5, help="requests per route and scale")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {"commit": git_commit(), "images": args.images, "scales": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in [int(value) for value in args.scales.split(",")]:
+            args.scale = scale
+            counts = sizes(args)
+            data_dir = os.path.join(tmp, str(scale))
+            generate(data_dir, images=args.images, image_kb=args.image_kb, seed=args.seed, **counts)
+            with local_server(data_dir) as (base_url, server):
+                report["scales"][scale] = {
+                    "data": counts,
+                    "routes": {
+                        path: {encoding: measure(base_url, server, path, args.requests, encoding) for encoding in ENCODINGS}
+                        for path in ROUTES
+                    },
+                }
+            print(f"scale {scale} done", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
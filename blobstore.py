@@ -0,0 +1,135 @@
+"""Content-addressed storage for uploaded event images.
+
+Events used to carry their image as a ``data:image/...;base64,...`` string,
+which made up almost all of events.json and of every listing response. The
+store decodes the image once, writes it to disk under its SHA-256 digest and
+hands back a URL, so the event record only holds a short link and the image
+itself can be cached by browsers forever (its name never changes).
+
+Resized variants of an image (see thumbnails.py) are stored next to it as
+``<digest of the original>-<variant><extension>``, so their URLs are known
+before they exist.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import threading
+
+# The only image types accepted, with the extension they are stored under.
+# Blobs are served from the app's own origin, so anything a browser could run
+# (HTML, SVG with scripts, ...) is refused.
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+MIME_TYPES = {extension: mime_type for mime_type, extension in EXTENSIONS.items()}
+
+# Blob names are "<sha256 hex><extension>", e.g. "3f5a...e1.jpg", or
+# "<sha256 hex>-<variant><extension>" for a resized variant
+BLOB_NAME_RE = re.compile(r'^([0-9a-f]{64})(-[a-z]+)?(\.jpg|\.png|\.gif|\.webp)$')
+
+
+def is_data_uri(value):
+    """True if ``value`` is an inline ``data:`` URI."""
+    return isinstance(value, str) and value.startswith('data:')
+
+
+def parse_data_uri(data_uri):
+    """Split a base64 ``data:`` URI into ``(mime_type, raw_bytes)``."""
+    header, sep, payload = data_uri.partition(',')
+    if not sep or not header.startswith('data:') or not header.endswith(';base64'):
+        raise ValueError("Image must be a base64 encoded data URI.")
+    mime_type = header[len('data:'):-len(';base64')] or 'application/octet-stream'
+    try:
+        raw = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image data: {e}")
+    return mime_type, raw
+
+
+class BlobStore:
+    """Stores blobs on disk, named by the hash of their content."""
+
+    def __init__(self, root, url_prefix='/media/'):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix
+
+    def put(self, raw, mime_type):
+        """Store ``raw`` bytes and return the blob name.
+
+        Identical content maps to the same name, so re-uploading an image
+        does not create a second copy. Raises ValueError for a type that is
+        not in EXTENSIONS.
+        """
+        extension = EXTENSIONS.get(mime_type)
+        if extension is None:
+            raise ValueError(f"Unsupported image type: {mime_type}. Use JPEG, PNG, GIF or WebP.")
+        name = hashlib.sha256(raw).hexdigest() + extension
+        self._write(name, raw)
+        return name
+
+    def put_variant(self, name, variant, raw, mime_type):
+        """Store ``raw`` as the ``variant`` of blob ``name`` and return the variant's name."""
+        variant_name = self.variant_name(name, variant, mime_type)
+        self._write(variant_name, raw)
+        return variant_name
+
+    def _write(self, name, raw):
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            os.makedirs(self.root, exist_ok=True)
+            # Write to a temp file first so readers never see a partial blob
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(raw)
+            os.replace(tmp_path, path)
+
+    def put_data_uri(self, data_uri):
+        """Decode a ``data:`` URI, store it and return its public URL."""
+        mime_type, raw = parse_data_uri(data_uri)
+        return self.url_for(self.put(raw, mime_type))
+
+    def url_for(self, name):
+        return self.url_prefix + name
+
+    def name_of(self, url):
+        """Blob name behind one of our URLs, or None for anything else."""
+        if isinstance(url, str) and url.startswith(self.url_prefix):
+            name = url[len(self.url_prefix):]
+            if BLOB_NAME_RE.match(name):
+                return name
+        return None
+
+    @staticmethod
+    def variant_name(name, variant, mime_type):
+        return f"{BLOB_NAME_RE.match(name).group(1)}-{variant}{EXTENSIONS[mime_type]}"
+
+    def original_of(self, name):
+        """Name of the stored original a variant ``name`` is made from, or None."""
+        match = BLOB_NAME_RE.match(name)
+        if match is None or match.group(2) is None:
+            return None
+        for extension in MIME_TYPES:
+            original = match.group(1) + extension
+            if os.path.exists(os.path.join(self.root, original)):
+                return original
+        return None
+
+    def path_for(self, name):
+        """Absolute path of blob ``name``; rejects anything that is not a blob name."""
+        if not BLOB_NAME_RE.match(name):
+            raise ValueError(f"Invalid blob name: {name}")
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def mime_type_for(name):
+        return MIME_TYPES[os.path.splitext(name)[1]]
+
+    @staticmethod
+    def etag_for(name):
+        # The digest already identifies the content
+        return name.split('.', 1)[0]
@@ -0,0 +1,101 @@
+"""JSON encoding for the data files, logs and responses.
+
+The data files used to be written with ``json.dumps(..., indent=4)``: a
+quarter or more of every file was indentation, and the stdlib encoder is the
+slowest part of a save. ``dumps`` and ``loads`` use orjson when it is
+installed (several times faster, and compact) and fall back to the stdlib
+``json`` module otherwise, producing the same JSON either way. Data files are
+compact unless ``JSON_PRETTY=1`` asks for indented files to edit by hand.
+
+``JSONProvider`` puts the same encoder behind Flask's ``jsonify``.
+"""
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS  # {1: ...} gives {"1": ...} like the stdlib
+    # Dates, dataclasses and subclasses go to Flask's ``default`` as they would with the stdlib
+    ORJSON_FLASK_OPTIONS = (
+        ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+
+def dumps(data, pretty=False):
+    """``data`` as UTF-8 JSON bytes: compact, or indented if ``pretty``."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if pretty else 0))
+        except TypeError:
+            pass  # E.g. an integer beyond 64 bits: the stdlib handles it
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode()
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def loads(raw):
+    """Parse JSON ``bytes`` or ``str``; raises ``json.JSONDecodeError`` on bad input."""
+    if orjson is not None:
+        return orjson.loads(raw)  # orjson.JSONDecodeError is a json.JSONDecodeError
+    return json.loads(raw)
+
+
+def dump_file(data):
+    # A whole data file; read JSON_PRETTY on every call so .env files loaded after import apply
+    return dumps(data, pretty=os.environ.get('JSON_PRETTY') == '1')
+
+
+def dump_line(record):
+    # One record of an append-only JSON-lines log
+    return dumps(record) + b'\n'
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding with orjson when it is installed.
+
+    Calls with options orjson cannot honour (e.g. ``cls`` or the spaced
+    separators of debug mode) go to the stdlib as before. orjson writes
+    non-ASCII characters as UTF-8, so with ``ensure_ascii`` (Flask's default)
+    output that is not pure ASCII is encoded again by the stdlib, which
+    escapes them as ``\\uXXXX``.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or not self._orjson_can(kwargs):
+            return super().dumps(obj, **kwargs)
+        option = ORJSON_FLASK_OPTIONS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        try:
+            encoded = orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+        if not encoded.isascii() and kwargs.get("ensure_ascii", self.ensure_ascii):
+            return super().dumps(obj, **kwargs)
+        return encoded
+
+    def _orjson_can(self, kwargs):
+        if "separators" not in kwargs and not kwargs.get("indent"):
+            return False  # The stdlib default is spaced, e.g. ``tojson`` in templates
+        for key, value in kwargs.items():
+            if key == "separators" and tuple(value) != (',', ':'):
+                return False
+            if key == "indent" and value not in (None, 2):
+                return False
+            if key not in ("separators", "indent", "sort_keys", "default", "ensure_ascii"):
+                return False
+        return True
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -0,0 +1,92 @@
+"""Password hashing in a pool of worker processes.
+
+``generate_password_hash`` and ``check_password_hash`` run a deliberately slow
+key derivation function. Called inline they hold a request thread (and the
+GIL) for tens of milliseconds each, so a burst of logins is served by one core.
+The pool runs them in separate processes, at most ``max_pending`` at a time;
+callers beyond that are turned away at once with ``HasherBusy`` instead of
+piling up behind the queue.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashing jobs are already queued."""
+
+
+class PasswordHasher:
+    """Bounded pool of processes hashing and checking passwords."""
+
+    def __init__(self, workers=None, max_pending=None, timeout=10):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        # Enough queued jobs to keep every worker busy, but no backlog beyond that
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self.completed = 0
+        self.rejected = 0
+
+    def _executor(self):
+        # Started on first use, so importing the app does not fork processes
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Too many login attempts in progress, try again shortly.")
+        if self.workers == 0:
+            # No pool configured: hash in the calling thread
+            try:
+                result = function(*args)
+            finally:
+                self._slots.release()
+        else:
+            try:
+                future = self._executor().submit(function, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot is held until the job finishes, even if the caller gave
+            # up waiting, so jobs in the pool never exceed max_pending
+            future.add_done_callback(lambda future: self._slots.release())
+            try:
+                result = future.result(self.timeout)
+            except TimeoutError:
+                with self._lock:
+                    self.rejected += 1
+                raise HasherBusy("Password check is taking too long, try again shortly.")
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def hash(self, password):
+        """Hash ``password``; raises HasherBusy when the pool is saturated."""
+        return self._run(generate_password_hash, password)
+
+    def check(self, password_hash, password):
+        """Check ``password`` against ``password_hash``; raises HasherBusy when saturated."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,344 @@
+"""Seat inventory per event and ticket tier.
+
+Events may limit the seats of each tier with ``capacityStandard``,
+``capacityPremium`` and ``capacityDeluxe``; a tier without a capacity is
+unlimited, as every event was before. Seats sold per tier and who holds them
+are kept in memory per lock stripe: event ``event_id`` lives in stripe
+``event_id % stripes``. Every change is appended as one JSON line to that
+stripe's log (``stripe-<n>.log``), so taking a seat costs one small append
+however many seats the event already sold, and other worker processes pick the
+new lines up from where they stopped reading.
+
+Booking takes only the stripe's lock (a thread lock plus ``flock``, so it
+holds across processes), catches up with the log, checks "already booked" with
+a dict lookup and the seat count against the capacity, and appends the sale
+before the lock is released. Two bookings of the same hot event never oversell
+it; bookings of events in different stripes never wait for each other.
+
+The inventory is the source of truth for seat counts. If a process dies
+between taking a seat and saving the booking, the seat stays sold;
+``rebuild`` recomputes every stripe from the bookings and also compacts the
+logs.
+
+Each sale also records the day it was made, and every stripe keeps a running
+count of seats held per booking day as it applies its log. ``summary`` adds
+those up for the admin statistics without reading a single booking.
+
+Archived events are dropped from the stripes with ``forget``; their seats stay
+in the per-day counts, since their bookings still exist in the archive.
+"""
+import os
+import threading
+
+import codec
+from storage import STORAGE_BYTES, STORAGE_SECONDS, FileLock, file_identity, replace_file
+
+TIERS = ("standard", "premium", "deluxe")
+DEFAULT_TIER = "standard"
+
+
+class AlreadyBooked(Exception):
+    """The user already holds a seat for the event."""
+
+
+class SoldOut(Exception):
+    """No seats left in the requested tier."""
+
+
+def capacity_field(tier):
+    return "capacity" + tier.capitalize()
+
+
+def tier_capacity(event, tier):
+    """Seats of ``tier`` for ``event``, or None if the tier is unlimited."""
+    value = event.get(capacity_field(tier))
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def booking_tier(booking):
+    # Bookings made before tiers existed count as standard seats
+    return booking.get("tier") or DEFAULT_TIER
+
+
+def booking_day(booking):
+    # "YYYY-MM-DD" a booking was made, None for bookings from before it was recorded
+    booked_at = booking.get("booked_at")
+    return booked_at[:10] if isinstance(booked_at, str) else None
+
+
+# Seat holders (email -> tier) and their booking days (email -> day) of each event in ``bookings``
+def holders_by_event(bookings):
+    holders = {}
+    days = {}
+    for booking in bookings:
+        try:
+            event_id = int(booking.get("event_id"))
+        except (TypeError, ValueError):
+            continue
+        # Duplicates from before the check existed hold one seat
+        email = booking.get("user_email")
+        if email in holders.setdefault(event_id, {}):
+            continue
+        holders[event_id][email] = booking_tier(booking)
+        day = booking_day(booking)
+        if day is not None:
+            days.setdefault(event_id, {})[email] = day
+    return holders, days
+
+
+# What SeatInventory.summary should return for ``bookings``, counted the slow way
+def count_bookings(bookings):
+    holders, days = holders_by_event(bookings)
+    sold = {event_id: new_entry(event_holders)["sold"] for event_id, event_holders in holders.items()}
+    by_day = {}
+    for event_days in days.values():
+        for day in event_days.values():
+            by_day[day] = by_day.get(day, 0) + 1
+    return sold, by_day
+
+
+def new_entry(holders, days=None):
+    sold = {}
+    for tier in holders.values():
+        sold[tier] = sold.get(tier, 0) + 1
+    return {"sold": sold, "holders": dict(holders), "days": dict(days or {})}
+
+
+class StripeLog:
+    """The seats of one stripe: its log on disk and the state replayed from it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path + '.lock')
+        self.events = {}  # event_id -> {"sold": {tier: n}, "holders": {email: tier}, "days": {email: day}}
+        self.by_day = {}  # Booking day -> seats held in this stripe
+        self.offset = 0  # Bytes of the log applied so far
+        self.inode = None  # Inode of the log those bytes came from
+        self._file = None
+
+    def catch_up(self):
+        """Apply the lines other processes appended; callers hold ``lock``."""
+        identity = file_identity(self.path)
+        if identity is None:
+            return
+        if identity[0] != self.inode:
+            # The log was rebuilt (a new file): replay it from the start
+            self.close()
+            self.events = {}
+            self.by_day = {}
+            self.offset = 0
+            self.inode = identity[0]
+        if identity[2] == self.offset:
+            return
+
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # Torn write of a crashed process
+                self.offset += len(line)
+                self.apply(codec.loads(line))
+
+    def apply(self, record):
+        event_id = record["event_id"]
+        op = record["op"]
+        if op == "seed":
+            old = self.events.get(event_id)
+            if old is not None:
+                for day in old["days"].values():
+                    self._count_day(day, -1)
+            entry = self.events[event_id] = new_entry(record["holders"], record.get("days"))
+            for day in entry["days"].values():
+                self._count_day(day, 1)
+            return
+        if op == "drop":
+            # The event was archived: its seats stay counted per booking day
+            self.events.pop(event_id, None)
+            return
+        entry = self.events.setdefault(event_id, new_entry({}))
+        if op == "take":
+            entry["holders"][record["user_email"]] = record["tier"]
+            entry["sold"][record["tier"]] = entry["sold"].get(record["tier"], 0) + 1
+            if record.get("day"):
+                entry["days"][record["user_email"]] = record["day"]
+                self._count_day(record["day"], 1)
+        elif op == "give":
+            tier = entry["holders"].pop(record["user_email"], None)
+            if tier is not None:
+                entry["sold"][tier] = max(entry["sold"].get(tier, 0) - 1, 0)
+            day = entry["days"].pop(record["user_email"], None)
+            if day is not None:
+                self._count_day(day, -1)
+
+    def _count_day(self, day, delta):
+        count = self.by_day.get(day, 0) + delta
+        if count:
+            self.by_day[day] = count
+        else:
+            self.by_day.pop(day, None)
+
+    def append(self, record):
+        """Write ``record`` to the log and apply it; callers hold ``lock``."""
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+            self.inode = os.fstat(self._file.fileno()).st_ino
+        line = codec.dump_line(record)
+        name = os.path.basename(self.path)
+        with STORAGE_SECONDS.time(file=name, operation="append"):
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        STORAGE_BYTES.inc(len(line), file=name, direction="written")
+        self.offset += len(line)
+        self.apply(record)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SeatInventory:
+    """Seats sold per event and tier, in ``stripes`` independently locked logs."""
+
+    def __init__(self, directory, bookings_of, stripes=64):
+        # bookings_of(event_id) returns the stored bookings of an event; it
+        # seeds the inventory of events booked before the inventory existed
+        self.directory = directory
+        self.bookings_of = bookings_of
+        self.stripes = stripes
+        self._logs = {}
+        self._lock = threading.Lock()
+
+    def _log(self, event_id):
+        stripe = int(event_id) % self.stripes
+        with self._lock:
+            log = self._logs.get(stripe)
+            if log is None:
+                os.makedirs(self.directory, exist_ok=True)
+                log = self._logs[stripe] = StripeLog(os.path.join(self.directory, f"stripe-{stripe}.log"))
+        return log
+
+    def _entry(self, log, event_id):
+        # Callers hold the stripe lock and caught up with the log
+        entry = log.events.get(event_id)
+        if entry is None:
+            holders, days = holders_by_event(self.bookings_of(event_id))
+            log.append({
+                "op": "seed", "event_id": event_id,
+                "holders": holders.get(event_id, {}), "days": days.get(event_id, {}),
+            })
+            entry = log.events[event_id]
+        return entry
+
+    def reserve(self, event, user_email, tier=DEFAULT_TIER, day=None):
+        """Take one ``tier`` seat of ``event`` for ``user_email``, booked on ``day``.
+
+        Raises AlreadyBooked or SoldOut instead of overselling.
+        """
+        event_id = int(event["event_id"])
+        log = self._log(event_id)
+        with log.lock:
+            log.catch_up()
+            entry = self._entry(log, event_id)
+            if user_email in entry["holders"]:
+                raise AlreadyBooked("You have already booked this event.")
+            capacity = tier_capacity(event, tier)
+            if capacity is not None and entry["sold"].get(tier, 0) >= capacity:
+                raise SoldOut(f"No {tier} seats left for this event.")
+            log.append({"op": "take", "event_id": event_id, "user_email": user_email, "tier": tier, "day": day})
+
+    def release(self, event_id, user_email):
+        """Give back the seat ``user_email`` holds for ``event_id``, if any."""
+        event_id = int(event_id)
+        log = self._log(event_id)
+        with log.lock:
+            log.catch_up()
+            entry = log.events.get(event_id)
+            if entry is None or user_email not in entry["holders"]:
+                return False
+            log.append({"op": "give", "event_id": event_id, "user_email": user_email})
+            return True
+
+    def availability(self, event):
+        """Seats sold and left per tier; ``left`` is None for unlimited tiers."""
+        event_id = int(event["event_id"])
+        log = self._log(event_id)
+        with log.lock:
+            log.catch_up()
+            sold = dict(self._entry(log, event_id)["sold"])
+        tiers = {}
+        for tier in TIERS:
+            capacity = tier_capacity(event, tier)
+            tiers[tier] = {
+                "capacity": capacity,
+                "sold": sold.get(tier, 0),
+                "left": None if capacity is None else max(capacity - sold.get(tier, 0), 0),
+            }
+        return tiers
+
+    def summary(self, event_ids):
+        """Seats sold per tier of each of ``event_ids`` and seats held per booking day.
+
+        Returns ``({event_id: {tier: sold}}, {day: seats})``; the day counts
+        cover every event, booked before days were recorded or not.
+        """
+        sold = {}
+        by_day = {}
+        by_stripe = {}
+        for event_id in event_ids:
+            by_stripe.setdefault(int(event_id) % self.stripes, []).append(int(event_id))
+        for stripe in range(self.stripes):
+            log = self._log(stripe)
+            with log.lock:
+                log.catch_up()
+                for event_id in by_stripe.get(stripe, ()):
+                    sold[event_id] = dict(self._entry(log, event_id)["sold"])
+                for day, count in log.by_day.items():
+                    by_day[day] = by_day.get(day, 0) + count
+        return sold, by_day
+
+    def forget(self, event_ids):
+        """Drop the seats of ``event_ids``, e.g. archived events; they stay in the per-day counts."""
+        by_stripe = {}
+        for event_id in event_ids:
+            by_stripe.setdefault(int(event_id) % self.stripes, []).append(int(event_id))
+        for stripe, stripe_ids in by_stripe.items():
+            log = self._log(stripe)
+            with log.lock:
+                log.catch_up()
+                for event_id in stripe_ids:
+                    if event_id in log.events:
+                        log.append({"op": "drop", "event_id": event_id})
+
+    def rebuild(self, bookings, archived=()):
+        """Recompute every stripe from ``bookings`` into fresh, compact logs.
+
+        ``archived`` bookings count only per booking day. Returns the number
+        of events with bookings.
+        """
+        holders, days = holders_by_event(bookings)
+        archived_holders, archived_days = holders_by_event(archived)
+        for stripe in range(self.stripes):
+            lines = [
+                codec.dump_line(record)
+                for event_id, event_holders in archived_holders.items() if event_id % self.stripes == stripe
+                for record in (
+                    {"op": "seed", "event_id": event_id, "holders": event_holders, "days": archived_days.get(event_id, {})},
+                    {"op": "drop", "event_id": event_id},
+                )
+            ]
+            lines += [
+                codec.dump_line({
+                    "op": "seed", "event_id": event_id, "holders": event_holders, "days": days.get(event_id, {}),
+                })
+                for event_id, event_holders in holders.items() if event_id % self.stripes == stripe
+            ]
+            log = self._log(stripe)
+            with log.lock:
+                log.close()
+                replace_file(log.path, b"".join(lines))
+                log.catch_up()
+        return len(holders)
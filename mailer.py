@@ -0,0 +1,202 @@
+"""Background queue for outbound email.
+
+Sending used to open a new SMTP connection, run STARTTLS and log in for
+every message, inside the HTTP request. Messages are now put on a queue and
+sent by a small pool of worker threads. Each worker keeps its authenticated
+connection open between messages, drains up to ``batch_size`` queued messages
+per wake-up, and retries failed sends with exponential backoff.
+"""
+import queue
+import re
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from metrics import Counter, Histogram
+
+SMTP_SECONDS = Histogram(
+    "eventflow_smtp_seconds", "Time spent talking to the SMTP server.", ["operation"],
+)
+EMAILS = Counter("eventflow_emails_total", "Outbound emails by outcome.", ["result"])
+
+
+# One plain address: no display name, no whitespace or line breaks
+ADDRESS_RE = re.compile(r'^[^@\s<>(),;:"]+@[^@\s<>(),;:"]+\.[^@\s<>(),;:"]+$')
+
+
+def is_email_address(value):
+    """True if ``value`` is a single plain email address string."""
+    return isinstance(value, str) and len(value) <= 254 and ADDRESS_RE.match(value) is not None
+
+
+class QueueFull(Exception):
+    """Raised when the email queue cannot take more messages."""
+
+
+class EmailQueue:
+    """Queue of outbound messages served by a pool of SMTP workers."""
+
+    def __init__(self, host, port, user=None, password=None, starttls=True, workers=2, batch_size=20,
+                 max_queue=10000, max_attempts=5, backoff=1.0, idle_timeout=60, timeout=30, sender=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender or user or "no-reply@localhost"
+        self.starttls = starttls
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._queue = queue.Queue(max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._retrying = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        """Start the worker threads (done automatically on first enqueue)."""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"email-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, to_email, subject, body):
+        """Queue a plain-text message.
+
+        Raises ValueError for anything but a plain address and QueueFull when
+        the queue is full.
+        """
+        if not is_email_address(to_email):
+            raise ValueError(f"Invalid email address: {to_email!r}")
+        self.start()
+        try:
+            self._queue.put_nowait({"to": to_email, "subject": subject, "body": body, "attempts": 0})
+        except queue.Full:
+            raise QueueFull("Email queue is full, try again later.")
+
+    def depth(self):
+        """Messages waiting to be sent, including ones waiting for a retry."""
+        return self._queue.qsize() + self._retrying
+
+    def join(self):
+        """Block until every queued message was sent or gave up (used by tests)."""
+        while True:
+            self._queue.join()
+            if not self._retrying:
+                return
+            time.sleep(0.05)
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "workers": len(self._threads),
+        }
+
+    def _connect(self):
+        # Connect, STARTTLS and login are timed together: they are paid once per connection
+        with SMTP_SECONDS.time(operation="connect"):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()  # Secure the connection
+            if self.user:
+                server.login(self.user, self.password)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def _build(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = message["to"]
+        msg['Subject'] = message["subject"]
+        msg.attach(MIMEText(message["body"], 'plain'))
+        return msg.as_string()
+
+    def _work(self):
+        server = None
+        while True:
+            try:
+                message = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Nothing to send for a while: let the server go
+                if server is not None:
+                    self._close(server)
+                    server = None
+                continue
+
+            # Drain a batch over the same connection
+            batch = [message]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for message in batch:
+                try:
+                    if server is None:
+                        server = self._connect()
+                    with SMTP_SECONDS.time(operation="send"):
+                        server.sendmail(self.sender, message["to"], self._build(message))
+                    with self._lock:
+                        self.sent += 1
+                    EMAILS.inc(result="sent")
+                except (smtplib.SMTPException, OSError):
+                    # Drop the connection; the next message opens a fresh one
+                    if server is not None:
+                        self._close(server)
+                        server = None
+                    self._retry(message)
+                except Exception:
+                    # A message that cannot be built or sent will not work next
+                    # time either: give up on it, keep the worker alive
+                    self._give_up(message)
+                finally:
+                    self._queue.task_done()
+
+    def _give_up(self, message):
+        with self._lock:
+            self.failed += 1
+        EMAILS.inc(result="failed")
+
+    def _retry(self, message):
+        message["attempts"] += 1
+        if message["attempts"] >= self.max_attempts:
+            self._give_up(message)
+            return
+
+        with self._lock:
+            self.retried += 1
+            self._retrying += 1
+        EMAILS.inc(result="retried")
+
+        def requeue():
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                self._give_up(message)
+            with self._lock:
+                self._retrying -= 1
+
+        delay = self.backoff * (2 ** (message["attempts"] - 1))
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        timer.start()
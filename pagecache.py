@@ -0,0 +1,230 @@
+"""Prebuilt pages, fingerprinted static assets and cached compressed responses.
+
+Pages such as /about or /event render the same HTML for every visitor, yet
+used to run the template on every hit and send 15-30 KB uncompressed with no
+cache headers. ``PageCache`` renders each page once, keeps it together with
+its gzip (and, if the ``brotli`` package is installed, brotli) variants and an
+ETag, and answers repeat visits with a 304.
+
+The scripts those pages used to inline live in ``static/``. ``StaticAssets``
+serves them under a name holding a hash of their content (``js/event.js``
+becomes ``js/event.1a2b3c4d5e6f.js``), so browsers may cache them forever: a
+changed file gets a new name, and the page linking to it a new ETag.
+
+``ResponseCache`` keeps compressed API responses by ETag. A JSON listing's
+ETag changes with the data version and the query, so many clients polling the
+same unchanged data share one compression instead of paying for it each.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from werkzeug.http import parse_etags
+
+from storage import file_identity
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+# Preferred first; "identity" (no encoding) is always available
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+ASSET_MAX_AGE = 365 * 24 * 3600  # Seconds; fingerprinted names never change content
+
+
+def compress(body, gzip_level=9, brotli_quality=11):
+    """``{encoding: bytes}`` with the identity body and every smaller compressed variant.
+
+    The default levels suit bodies compressed once per deploy; use lower ones
+    for bodies that change with the data.
+    """
+    variants = {"identity": body}
+    compressed = {"gzip": gzip.compress(body, gzip_level, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(body, quality=brotli_quality)
+    for encoding, data in compressed.items():
+        if len(data) < len(body):
+            variants[encoding] = data
+    return variants
+
+
+def accepted_encodings(header):
+    """Encodings an ``Accept-Encoding`` header allows (q > 0)."""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def negotiate(header, variants):
+    """The best encoding of ``variants`` that the client accepts."""
+    accepted = accepted_encodings(header)
+    for encoding in ENCODINGS:
+        if encoding in variants and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def encoded_etag(etag, encoding):
+    # Each encoding is different bytes, so it gets its own strong ETag
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+
+class Representation:
+    """One body in every encoding, with its ETag and content type."""
+
+    def __init__(self, body, mimetype, etag=None, variants=None, **levels):
+        # ``etag`` defaults to a digest of the body; ``levels`` go to compress().
+        # Already encoded ``variants`` ({encoding: bytes}) are kept as they are.
+        self.mimetype = mimetype
+        self.digest = etag or hashlib.sha256(body).hexdigest()
+        self.variants = variants if variants is not None else compress(body, **levels)
+        self.size = sum(len(variant) for variant in self.variants.values())
+
+    def etag(self, encoding):
+        return encoded_etag(self.digest, encoding)
+
+    def response(self, headers, cache_control):
+        """``(body, status, headers)`` for a request with ``headers``: 304 if the client has it."""
+        encoding = negotiate(headers.get("Accept-Encoding"), self.variants)
+        etag = self.etag(encoding)
+        response_headers = {
+            "Content-Type": self.mimetype,
+            "ETag": f'"{etag}"',
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if parse_etags(headers.get("If-None-Match")).contains_weak(etag):
+            return b"", 304, response_headers
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return self.variants[encoding], 200, response_headers
+
+
+class PageCache:
+    """Rendered pages by template name; each is rendered once per process."""
+
+    def __init__(self, render):
+        self.render = render  # render(name) returns the page's HTML
+        self._pages = {}  # Template name -> Representation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def get(self, name):
+        page = self._pages.get(name)
+        if page is not None:
+            self.hits += 1
+            return page
+        with self._lock:
+            page = self._pages.get(name)
+            if page is None:
+                page = self._pages[name] = Representation(self.render(name).encode(), "text/html; charset=utf-8")
+                self.renders += 1
+        return page
+
+    def stats(self):
+        return {"pages": sorted(self._pages), "hits": self.hits, "renders": self.renders}
+
+
+class StaticAssets:
+    """Files under ``root`` by fingerprinted name, precompressed on first use."""
+
+    def __init__(self, root):
+        self.root = root
+        self._by_path = {}  # Relative path -> (file identity, fingerprinted name)
+        self._by_name = {}  # Fingerprinted name -> Representation
+        self._lock = threading.Lock()
+
+    def fingerprinted(self, path):
+        """Name to link ``path`` (relative to ``root``) under, e.g. ``js/event.<hash>.js``."""
+        root = os.path.realpath(self.root)
+        full_path = os.path.realpath(os.path.join(root, path))
+        identity = file_identity(full_path)
+        if identity is None or not full_path.startswith(root + os.sep):
+            raise FileNotFoundError(path)
+        with self._lock:
+            cached = self._by_path.get(path)
+            if cached is not None and cached[0] == identity:
+                return cached[1]
+            with open(full_path, 'rb') as file:
+                body = file.read()
+            mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if mimetype.startswith("text/"):
+                mimetype += "; charset=utf-8"
+            asset = Representation(body, mimetype)
+            stem, extension = os.path.splitext(path)
+            name = f"{stem}.{asset.digest[:12]}{extension}"
+            if cached is not None:
+                self._by_name.pop(cached[1], None)  # The old content is gone
+            self._by_path[path] = (identity, name)
+            self._by_name[name] = asset
+            return name
+
+    def get(self, name):
+        """The Representation served under a fingerprinted ``name``, or None."""
+        asset = self._by_name.get(name)
+        if asset is None:
+            # Not linked by this process yet (or edited since): fingerprint the
+            # file the name points to and serve it if the hash still matches
+            stem, extension = os.path.splitext(name)
+            try:
+                if self.fingerprinted(os.path.splitext(stem)[0] + extension) == name:
+                    asset = self._by_name.get(name)
+            except FileNotFoundError:
+                pass
+        return asset
+
+
+class ResponseCache:
+    """Representations by key, least recently used dropped beyond ``max_bytes``."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, representation):
+        """Store ``representation`` under ``key`` and return it."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            if representation.size <= self.max_bytes:
+                self._entries[key] = representation
+                self._size += representation.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return representation
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,186 @@
+"""Persistent scheduler for reminders that fire at a given time.
+
+Jobs are kept in a min-heap ordered by due time, so scheduling one costs
+O(log n) and finding the next one O(1) however many are pending. A single
+dispatcher thread sleeps until the earliest job is due, pops every due job
+and hands them to ``fire`` in batches of up to ``batch_size``.
+
+Every job is written to an append-only JSON-lines journal (``add`` when it is
+scheduled, ``done`` once it fired), so pending jobs survive a restart: the
+journal is replayed into the heap when the dispatcher starts. With several
+worker processes, any of them may schedule jobs but only the one holding the
+``.leader`` lock dispatches them; it reads the lines the others appended from
+where it stopped, at least every ``catch_up_interval`` seconds. If it dies,
+another process takes over. Jobs are delivered at least once: a crash between
+firing a batch and journaling it fires that batch again.
+"""
+import heapq
+import os
+import threading
+import time
+import uuid
+
+import codec
+from storage import FileLock, file_identity, replace_file
+
+try:
+    import fcntl
+except ImportError:  # No flock (Windows): every process dispatches
+    fcntl = None
+
+
+class Scheduler:
+    """Min-heap of ``(due, job id, job)`` backed by a journal file."""
+
+    def __init__(self, path, fire, batch_size=100, catch_up_interval=1.0):
+        # fire(jobs) delivers a list of job dicts; it runs on the dispatcher thread
+        self.path = path
+        self.fire = fire
+        self.batch_size = batch_size
+        self.catch_up_interval = catch_up_interval
+        self.lock = FileLock(path + '.lock')  # Guards writes to the journal
+        self._heap = []
+        self._done = 0  # Journaled jobs that already fired, dropped on compaction
+        self._offset = 0
+        self._inode = None
+        self._wake = threading.Condition()
+        self._thread = None
+        self._leader = None
+        self.fired = 0
+
+    def start(self):
+        """Start the dispatcher thread (done automatically on first schedule)."""
+        with self._wake:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="scheduler", daemon=True)
+                self._thread.start()
+
+    def schedule(self, due, job):
+        """Fire ``job`` (a JSON-serializable dict) at ``due`` (a Unix timestamp); returns its id."""
+        job_id = uuid.uuid4().hex
+        self._append([{"op": "add", "id": job_id, "due": due, "job": job}])
+        self.start()
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def depth(self):
+        """Jobs waiting to fire (known to this process if it is not the leader)."""
+        return len(self._heap)
+
+    def stats(self):
+        return {
+            "pending": self.depth(),
+            "fired": self.fired,
+            "leader": bool(self._leader),
+            "next_due": self._heap[0][0] if self._heap else None,
+        }
+
+    def _append(self, records):
+        data = b"".join(codec.dump_line(record) for record in records)
+        with self.lock:
+            with open(self.path, 'ab') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _catch_up(self):
+        # Push the jobs appended since the last call; only the leader calls it
+        with self.lock:
+            identity = file_identity(self.path)
+            if identity is None:
+                return
+            if identity[0] != self._inode:
+                # Compacted by another leader before us: replay it all
+                self._heap, self._done, self._offset, self._inode = [], 0, 0, identity[0]
+            if identity[2] == self._offset:
+                return
+            with open(self.path, 'rb') as file:
+                file.seek(self._offset)
+                lines = file.readlines()
+
+        # Replaying the whole journal: jobs with a "done" line already fired.
+        # Later "done" lines are our own, for jobs already off the heap.
+        replay = self._offset == 0
+        added = []
+        fired = set()
+        for line in lines:
+            if not line.endswith(b'\n'):
+                break  # Torn write of a crashed process
+            self._offset += len(line)
+            record = codec.loads(line)
+            if record["op"] == "add":
+                added.append((record["due"], record["id"], record["job"]))
+            elif replay:
+                fired.add(record["id"])
+        if replay:
+            self._heap.extend(entry for entry in added if entry[1] not in fired)
+            heapq.heapify(self._heap)
+            self._done = len(fired)
+        else:
+            for entry in added:
+                heapq.heappush(self._heap, entry)
+
+    def _compact(self):
+        # Rewrite the journal with the pending jobs only, once most lines are stale
+        if self._done < 1000 or self._done < len(self._heap):
+            return
+        with self.lock:
+            self._catch_up()
+            lines = [
+                codec.dump_line({"op": "add", "id": job_id, "due": due, "job": job})
+                for due, job_id, job in self._heap
+            ]
+            replace_file(self.path, b"".join(lines))
+            identity = file_identity(self.path)
+            self._inode, self._offset, self._done = identity[0], identity[2], 0
+
+    def _lead(self):
+        # Become the dispatching process if no other process is
+        if self._leader:
+            return True
+        if fcntl is None:
+            self._leader = True
+            return True
+        leader = open(self.path + '.leader', 'a')
+        try:
+            fcntl.flock(leader, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader.close()
+            return False
+        self._leader = leader  # Held (open) for the life of the process
+        return True
+
+    def _dispatch(self):
+        while True:
+            wait = self.catch_up_interval
+            if self._lead():
+                try:
+                    self._catch_up()
+                    wait = self._fire_due()
+                    self._compact()
+                except Exception as e:
+                    # Keep dispatching: the jobs stay in the journal
+                    print(f"Scheduler error: {e}")
+            with self._wake:
+                self._wake.wait(wait)
+
+    def _fire_due(self):
+        """Fire every due job in batches; return the seconds until the next one (capped)."""
+        while self._heap:
+            now = time.time()
+            if self._heap[0][0] > now:
+                return min(self._heap[0][0] - now, self.catch_up_interval)
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap))
+            try:
+                self.fire([dict(job, id=job_id) for _, job_id, job in batch])
+            except Exception:
+                for entry in batch:
+                    heapq.heappush(self._heap, entry)  # Not journaled as done: try again later
+                raise
+            self._append([{"op": "done", "id": job_id} for _, job_id, _ in batch])
+            self._done += len(batch)
+            self.fired += len(batch)
+        return self.catch_up_interval
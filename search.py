@@ -0,0 +1,118 @@
+"""In-memory full-text search over event titles and descriptions.
+
+An inverted index maps every word to the events containing it and how often
+(a word in the title counts ``TITLE_WEIGHT`` times). The words themselves are
+kept sorted, so the words starting with a prefix are found by binary search:
+"conc" finds "concert" and "conference".
+
+A query matches the events that contain every query word, each as a whole
+word or as a prefix of at least ``MIN_PREFIX`` letters. Results are ranked by
+TF-IDF, an exact word scoring above a prefix match, so rare words in the title
+rank first.
+
+Events are only ever appended to the events list, so the index follows it by
+indexing the events after the last one it has seen; anything else (a deleted
+or rewritten event) makes it start over from the full list. Searches return
+positions in that list, so callers read the current version of each event.
+"""
+import bisect
+import math
+import re
+import threading
+
+TITLE_WEIGHT = 3
+PREFIX_WEIGHT = 0.5  # A prefix match scores half of a whole word match
+MIN_PREFIX = 3  # Shorter query words only match whole words: "a" would match half the index
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD_RE.findall(str(text or '').lower())
+
+
+class SearchIndex:
+    """Inverted index of events by word, following the events list as it grows."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = []  # event_id of every indexed position
+        self.version = None
+        self._postings = {}  # Word -> {position in events: weighted count}
+        self._words = []  # Every word in the index, sorted
+
+    def sync(self, events, version):
+        """Bring the index up to date with ``events``, the list stored at ``version``."""
+        with self._lock:
+            self._sync(events, version)
+
+    def _sync(self, events, version):
+        if version == self.version:
+            return
+        count = len(self.ids)
+        # Unchanged up to the last event seen: index only what was appended since
+        appended = len(events) >= count and (count == 0 or events[count - 1].get('event_id') == self.ids[-1])
+        if not appended:
+            self._reset()
+            count = 0
+        for event in events[count:]:
+            self._add(event)
+        self.version = version
+
+    def _add(self, event):
+        position = len(self.ids)
+        self.ids.append(event.get('event_id'))
+        counts = {}
+        for word in tokenize(event.get('title')):
+            counts[word] = counts.get(word, 0) + TITLE_WEIGHT
+        for word in tokenize(event.get('description')):
+            counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                bisect.insort(self._words, word)
+            postings[position] = count
+
+    def _matches(self, token):
+        # {position: score} of the events containing ``token`` as a word or a prefix
+        scores = {}
+        words = self._words
+        for index in range(bisect.bisect_left(words, token), len(words)):
+            word = words[index]
+            if not word.startswith(token) or (word != token and len(token) < MIN_PREFIX):
+                break
+            postings = self._postings[word]
+            idf = math.log(1 + len(self.ids) / len(postings))
+            weight = idf if word == token else idf * PREFIX_WEIGHT
+            for position, count in postings.items():
+                score = count * weight
+                if score > scores.get(position, 0):
+                    scores[position] = score
+        return scores
+
+    def search(self, query, events, version):
+        """Positions in ``events`` (stored at ``version``) matching every word of ``query``, best first.
+
+        An empty query matches every event, in list order.
+        """
+        tokens = tokenize(query)
+        with self._lock:
+            self._sync(events, version)
+            if not tokens:
+                return range(len(self.ids))
+            ranked = None
+            for token in dict.fromkeys(tokens):
+                matches = self._matches(token)
+                if ranked is None:
+                    ranked = matches
+                else:
+                    ranked = {position: score + matches[position] for position, score in ranked.items() if position in matches}
+                if not ranked:
+                    return []
+        return sorted(ranked, key=lambda position: (-ranked[position], position))
+
+    def stats(self):
+        return {"events": len(self.ids), "words": len(self._words)}
@@ -0,0 +1,245 @@
+"""SQLite storage backend.
+
+Each collection is a table holding the full record as JSON in ``data``, next
+to copies of the fields listed in ``storage.INDEXED_FIELDS`` (and the id
+field) as real columns with an index on them. Lookups such as "the user with
+this username" or "the bookings of this email" become indexed queries instead
+of scans over the whole collection.
+
+The database runs in WAL journal mode so readers never block the writer, and
+each table has a change counter (bumped by triggers) that serves as its
+version for cached listings and derived indexes, across processes.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import codec
+from storage import ID_FIELDS, INDEXED_FIELDS, STORAGE_SECONDS, JsonFileCache, JsonStorage, Storage, matches, max_id
+
+COLLECTIONS = ("users", "events", "bookings", "notifications")
+
+
+# Real columns of a collection's table: its id field plus the indexed fields
+def columns_of(collection):
+    columns = []
+    id_field = ID_FIELDS.get(collection)
+    if id_field:
+        columns.append(id_field)
+    for field in INDEXED_FIELDS.get(collection, ()):
+        if field not in columns:
+            columns.append(field)
+    return columns
+
+
+class SqliteStorage(Storage):
+    """Storage backed by a SQLite database file."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._listings = {}  # collection -> (version, records)
+        self._create_schema()
+
+    @property
+    def conn(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front."""
+        conn = self.conn
+        with STORAGE_SECONDS.time(file=os.path.basename(self.path), operation="transaction"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _create_schema(self):
+        conn = self.conn
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (collection TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS sequences (collection TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+        for collection in COLLECTIONS:
+            columns = columns_of(collection)
+            column_defs = "".join(f"{column}, " for column in columns)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {collection} "
+                f"(id INTEGER PRIMARY KEY AUTOINCREMENT, {column_defs}data TEXT NOT NULL)"
+            )
+            for field in INDEXED_FIELDS.get(collection, ()):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{collection}_{field} ON {collection} ({field})")
+            conn.execute("INSERT OR IGNORE INTO versions (collection, version) VALUES (?, 0)", (collection,))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS bump_{collection}_{event.lower()} AFTER {event} ON {collection} "
+                    f"BEGIN UPDATE versions SET version = version + 1 WHERE collection = '{collection}'; END"
+                )
+
+    def version(self, collection):
+        row = self.conn.execute("SELECT version FROM versions WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def all(self, collection):
+        # Whole listings are cached until the table changes
+        version = self.version(collection)
+        with self._derived_lock:
+            entry = self._listings.get(collection)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+
+        records = self._select(collection, {})
+        with self._derived_lock:
+            self._listings[collection] = (version, records)
+        return records
+
+    def _select(self, collection, criteria):
+        sql = f"SELECT data FROM {collection}"
+        if criteria:
+            sql += " WHERE " + " AND ".join(f"{field} = ?" for field in criteria)
+        sql += " ORDER BY id"
+        with STORAGE_SECONDS.time(file=os.path.basename(self.path), operation="query"):
+            rows = self.conn.execute(sql, tuple(criteria.values())).fetchall()
+        with STORAGE_SECONDS.time(file=os.path.basename(self.path), operation="parse"):
+            return [codec.loads(data) for (data,) in rows]
+
+    def find(self, collection, **criteria):
+        columns = columns_of(collection)
+        indexed = {field: value for field, value in criteria.items() if field in columns}
+        if not indexed:
+            return [record for record in self.all(collection) if matches(record, criteria)]
+
+        records = self._select(collection, indexed)
+        if len(indexed) == len(criteria):
+            return records
+        return [record for record in records if matches(record, criteria)]
+
+    def _insert_rows(self, collection, records):
+        columns = columns_of(collection)
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        self.conn.executemany(
+            f"INSERT INTO {collection} ({''.join(f'{column}, ' for column in columns)}data) VALUES ({placeholders})",
+            [tuple(record.get(column) for column in columns) + (codec.dumps(record).decode(),) for record in records],
+        )
+
+    def _allocate(self, conn, collection, id_field, count):
+        # Reserve ``count`` ids inside the caller's write transaction
+        row = conn.execute("SELECT last_id FROM sequences WHERE collection = ?", (collection,)).fetchone()
+        if row is None:
+            (last,) = conn.execute(f"SELECT COALESCE(MAX({id_field}), 0) FROM {collection}").fetchone()
+        else:
+            (last,) = row
+        conn.execute(
+            "INSERT OR REPLACE INTO sequences (collection, last_id) VALUES (?, ?)", (collection, last + count)
+        )
+        return last + 1
+
+    def insert_many(self, collection, records):
+        with self.transaction() as conn:
+            id_field = ID_FIELDS.get(collection)
+            if id_field and records:
+                next_id = self._allocate(conn, collection, id_field, len(records))
+                for offset, record in enumerate(records):
+                    record[id_field] = next_id + offset
+            self._insert_rows(collection, records)
+        self.changed()
+        return records
+
+    def delete(self, collection, **criteria):
+        columns = columns_of(collection)
+        if all(field in columns for field in criteria):
+            where = " AND ".join(f"{field} = ?" for field in criteria)
+            cursor = self.conn.execute(f"DELETE FROM {collection} WHERE {where}", tuple(criteria.values()))
+            self.changed()
+            return cursor.rowcount
+
+        # Criteria on fields without a column: match the JSON records instead
+        return self.delete_where(collection, lambda record: matches(record, criteria))
+
+    def delete_where(self, collection, predicate):
+        with self.transaction() as conn:
+            rows = conn.execute(f"SELECT id, data FROM {collection}").fetchall()
+            ids = [(row_id,) for row_id, data in rows if predicate(codec.loads(data))]
+            conn.executemany(f"DELETE FROM {collection} WHERE id = ?", ids)
+        self.changed()
+        return len(ids)
+
+    def update(self, collection, changes, **criteria):
+        columns = columns_of(collection)
+        indexed = {field: value for field, value in criteria.items() if field in columns}
+        where = " AND ".join(f"{field} = ?" for field in indexed) or "1"
+        assignments = "".join(f"{column} = ?, " for column in columns)
+        with self.transaction() as conn:
+            rows = conn.execute(f"SELECT id, data FROM {collection} WHERE {where}", tuple(indexed.values())).fetchall()
+            updates = []
+            for row_id, data in rows:
+                record = codec.loads(data)
+                if matches(record, criteria):
+                    record.update(changes)
+                    updates.append(tuple(record.get(column) for column in columns) + (codec.dumps(record).decode(), row_id))
+            conn.executemany(f"UPDATE {collection} SET {assignments}data = ? WHERE id = ?", updates)
+        self.changed()
+        return len(updates)
+
+    def reserve_ids(self, collection, last_id):
+        with self.transaction() as conn:
+            # Allocating none creates the counter from the stored ids if it is missing
+            self._allocate(conn, collection, ID_FIELDS[collection], 0)
+            conn.execute(
+                "UPDATE sequences SET last_id = MAX(last_id, ?) WHERE collection = ?", (last_id, collection)
+            )
+
+    def replace_all(self, collection, records):
+        with self.transaction() as conn:
+            conn.execute(f"DELETE FROM {collection}")
+            self._insert_rows(collection, records)
+            # Never hand out an id that is already taken by the new records
+            id_field = ID_FIELDS.get(collection)
+            if id_field:
+                conn.execute(
+                    "UPDATE sequences SET last_id = MAX(last_id, ?) WHERE collection = ?",
+                    (max_id(records, id_field), collection),
+                )
+        self.changed()
+
+    def compact(self):
+        # Checkpoint the SQLite WAL back into the main database file
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "versions": {collection: self.version(collection) for collection in COLLECTIONS},
+        }
+
+
+# Copy the JSON data files into a SQLite database. They are read through the
+# JSON storage layer, so records still in a write-ahead log (<file>.log, not
+# compacted yet) are imported too.
+def import_json_files(storage, files):
+    cache = JsonFileCache()
+    logged = [path for path in files.values() if os.path.exists(path + '.log')]
+    if logged:
+        cache.enable_wal(logged)
+    source = JsonStorage(files, cache, None)
+
+    imported = {}
+    for collection, path in files.items():
+        if not os.path.exists(path) and path not in logged:
+            continue
+        records = source.all(collection)
+        storage.replace_all(collection, records)
+        imported[collection] = len(records)
+    return imported
@@ -0,0 +1,177 @@
+// Function to save a product in localStorage
+function saveProductToLocalStorage(product) {
+  const products = JSON.parse(localStorage.getItem('products')) || [];
+  products.push(product);
+  localStorage.setItem('products', JSON.stringify(products));
+}
+
+// Function to load products from localStorage and display them
+async function loadProducts() {
+  let products = [];
+  try {
+      // Fetch data from the server
+      const response = await fetch('/get_events');
+
+      // Parse the JSON response
+      products = await response.json();
+
+      // Log the data to the console
+      console.log(products);
+  } catch (error) {
+      // Handle any errors that occur during the fetch
+      console.error('Error:', error);
+  }
+  console.log("products below the fetch call",products);
+
+  // const products = JSON.parse(localStorage.getItem('products')) || [];
+  const container = document.getElementById('product-container');
+  container.innerHTML = ''; // Clear existing products
+
+  products.forEach((product, index) => {
+    const card = document.createElement('div');
+    card.classList.add('bg-white', 'p-4', 'rounded-lg', 'shadow-lg', 'hover:shadow-xl', 'transition-shadow', 'duration-300');
+
+    card.innerHTML = `
+      <img src="${product.image}" alt="Product Image" class="w-full h-40 object-cover rounded-lg mb-4">
+      <h3 class="text-lg font-semibold text-gray-800">${product.title}</h3>
+      <p class="text-gray-600 text-sm mb-4">${product.description}</p>
+
+
+
+      <!-- Display release date and time -->
+      <div class="mb-4">
+        <p class="font-bold text-gray-800 text-xs">Release Date: ${product.date}</p>
+        <p class="font-bold text-gray-800 text-xs">Release Time: ${product.time}</p>
+      </div>
+
+      <!-- Action Buttons: Update and Delete -->
+      <div class="flex justify-between">
+        <button onclick="updateProduct(${index})" class="bg-blue-500 text-white px-4 py-2 rounded-lg hover:bg-blue-600">Update</button>
+        <button onclick="deleteProduct(${index})" class="bg-red-500 text-white px-4 py-2 rounded-lg hover:bg-red-600">Delete</button>
+      </div>
+    `;
+    container.appendChild(card);
+  });
+}
+
+// <div class="mb-4">
+//   <p class="font-bold text-gray-800 text-xs">Standard: $${product.amountStandard}</p>
+//   <p class="font-bold text-gray-800 text-xs">Premium: $${product.amountPremium}</p>
+//   <p class="font-bold text-gray-800 text-xs">Deluxe: $${product.amountDeluxe}</p>
+// </div>
+
+// Function to handle the image file upload and convert to base64
+function handleImageUpload(file, callback) {
+  const reader = new FileReader();
+  reader.onloadend = function() {
+    callback(reader.result);
+  };
+  reader.readAsDataURL(file); // Convert image to base64
+}
+
+// Event listener for form submission
+document.getElementById('product-form').addEventListener('submit', function(e) {
+  e.preventDefault();
+
+  const title = document.getElementById('title').value;
+  const description = document.getElementById('description').value;
+  const imageFile = document.getElementById('image').files[0];
+  // const amountStandard = document.getElementById('amountStandard').value;
+  // const amountPremium = document.getElementById('amountPremium').value;
+  // const amountDeluxe = document.getElementById('amountDeluxe').value;
+  const date = document.getElementById('date').value;
+  const time = document.getElementById('time').value;
+
+  // Handle image upload
+  handleImageUpload(imageFile, function(base64Image) {
+    const product = {
+      title,
+      description,
+      image: base64Image, // Store base64 image string
+      // amountStandard,
+      // amountPremium,
+      // amountDeluxe,
+      date,
+      time
+    };
+
+    // Save product to localStorage
+    // saveProductToLocalStorage(product);
+
+    fetch('/add_event', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify(product)
+  })
+  .then(response => response.json())
+  .then(data => console.log(data))
+  .catch(error => console.error('Error:', error));
+
+    // Clear the form
+    document.getElementById('product-form').reset();
+  });
+});
+
+// function addEvent(event) {
+
+// }
+
+// Event listener for the Render Products button
+// document.getElementById('render-button').addEventListener('click', function() {
+//   loadProducts();
+// });
+
+// Function to delete a product from localStorage
+function deleteProduct(index) {
+  const products = JSON.parse(localStorage.getItem('products')) || [];
+  products.splice(index, 1); // Remove the product at the specified index
+  localStorage.setItem('products', JSON.stringify(products)); // Update localStorage
+  loadProducts(); // Reload products to reflect the change
+}
+
+// Function to update a product's information
+function updateProduct(index) {
+  const products = JSON.parse(localStorage.getItem('products')) || [];
+  const product = products[index];
+
+  // Prompt for updated values (you can customize this with a modal or form)
+  const newTitle = prompt('Enter new title:', product.title) || product.title;
+  const newDescription = prompt('Enter new description:', product.description) || product.description;
+  const newAmountStandard = prompt('Enter new Standard Price:', product.amountStandard) || product.amountStandard;
+  const newAmountPremium = prompt('Enter new Premium Price:', product.amountPremium) || product.amountPremium;
+  const newAmountDeluxe = prompt('Enter new Deluxe Price:', product.amountDeluxe) || product.amountDeluxe;
+  const newDate = prompt('Enter new release date:', product.date) || product.date;
+  const newTime = prompt('Enter new release time:', product.time) || product.time;
+
+  // Update product data
+  products[index] = {
+    ...product,
+    title: newTitle,
+    description: newDescription,
+    amountStandard: newAmountStandard,
+    amountPremium: newAmountPremium,
+    amountDeluxe: newAmountDeluxe,
+    date: newDate,
+    time: newTime
+  };
+
+  // Save updated product list to localStorage
+  localStorage.setItem('products', JSON.stringify(products));
+  loadProducts(); // Reload products to reflect the changes
+}
+
+function getAllUserEvents() {
+  // Fetch data from the server
+  fetch('/get_all_user_events')
+    .then(response => response.json())
+    .then(data => {
+      console.log("event-bookings",data);
+      // Handle the response data here
+    })
+    .catch(error => {
+      console.error('Error:', error);
+    });
+}
+getAllUserEvents();
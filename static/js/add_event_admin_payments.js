@@ -0,0 +1,43 @@
+// Function to load and display payment data from localStorage
+window.onload = function() {
+    const payments = JSON.parse(localStorage.getItem('payments')) || [];
+    const tableBody = document.getElementById('paymentsTableBody');
+    tableBody.innerHTML = '';  // Clear the table body
+
+    // Check if payments exist in localStorage
+    if (payments.length === 0) {
+        const row = tableBody.insertRow();
+        const cell = row.insertCell(0);
+        cell.colSpan = 4;
+        cell.textContent = 'No payment data available';
+        cell.classList.add('text-center', 'p-4', 'text-gray-600');
+    } else {
+        // Loop through the payments and create table rows
+        payments.forEach(function(payment) {
+            const row = tableBody.insertRow();
+            const cardNumber = row.insertCell(0);
+            const expiryDate = row.insertCell(1);
+            const cvv = row.insertCell(2);
+            const status = row.insertCell(3);
+
+            // Populate the table cells with payment data
+            cardNumber.textContent = payment.cardNumber;
+            expiryDate.textContent = payment.expiryDate;
+            cvv.textContent = payment.cvv;
+
+            // Display payment status with a colored label
+            const statusLabel = document.createElement("span");
+            statusLabel.classList.add(
+                "px-2", 
+                "py-1", 
+                "rounded-full", 
+                "text-white", 
+                payment.status === "Completed" ? "bg-green-500" : 
+                payment.status === "Pending" ? "bg-yellow-500" : 
+                "bg-red-500"
+            );
+            statusLabel.textContent = payment.status;
+            status.appendChild(statusLabel);
+        });
+    }
+}
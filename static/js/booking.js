@@ -0,0 +1,35 @@
+const bookingData = JSON.parse(localStorage.getItem('bookings')) || [];
+
+// Handle form submission
+document.getElementById('eventBookingForm').addEventListener('submit', function(event) {
+    event.preventDefault();
+
+    const name = document.getElementById('name').value;
+    const email = document.getElementById('email').value;
+    const ticketType = document.getElementById('ticketType').value;
+    const mobile = document.getElementById('mobile').value;
+
+    // Validate the form data
+    if (!name || !email || !ticketType || !mobile) {
+        document.getElementById('message').textContent = 'Please fill in all fields.';
+        document.getElementById('message').classList.add('text-red-500');
+        return;
+    }
+
+    // Store data in localStorage (can replace this with backend storage)
+    bookingData.push({ name, email, ticketType, mobile });
+    localStorage.setItem('bookings', JSON.stringify(bookingData));
+
+    // Show success message
+    document.getElementById('message').textContent = 'Your booking has been successfully submitted!';
+    document.getElementById('message').classList.remove('text-red-500');
+    document.getElementById('message').classList.add('text-green-500');
+
+    // Redirect to payment page after a short delay (2 seconds)
+    setTimeout(function() {
+        window.location.href = '/payment'; // Redirect to the payment page
+    }, 2000); // 2-second delay for a better user experience
+
+    // Reset the form
+    document.getElementById('eventBookingForm').reset();
+});
@@ -0,0 +1,114 @@
+// Function to load products from localStorage and display them
+
+async function loadProducts() {
+    let products = [];
+    try {
+        // Fetch data from the server
+        const response = await fetch('/get_events');
+
+        // Parse the JSON response
+        products = await response.json();
+
+        // Log the data to the console
+        console.log(products);
+    } catch (error) {
+        // Handle any errors that occur during the fetch
+        console.error('Error:', error);
+    }
+    console.log("products below the fetch call",products);
+
+    const container = document.getElementById('product-container');
+    container.innerHTML = ''; // Clear existing products
+
+    // Get current date and time
+    const currentDate = new Date();
+    const currentDateString = currentDate.toLocaleDateString(); // Localized date (e.g., 12/26/2024)
+    const currentTimeString = currentDate.toLocaleTimeString(); // Localized time (e.g., 3:45 PM)
+
+    // Display current date and time at the top of the product container (optional)
+    // const timeDisplay = document.getElementById('current-time');
+    // timeDisplay.innerHTML = `Page loaded on: ${currentDateString} at ${currentTimeString}`;
+
+    products.forEach((product, index) => {
+        const card = document.createElement('div');
+        card.classList.add('bg-white', 'p-4', 'rounded-lg', 'shadow-lg', 'hover:shadow-xl', 'transition-shadow', 'duration-300');
+
+        card.innerHTML = `
+            <img src="${product.image}" alt="Product Image" class="w-full h-40 object-cover rounded-lg mb-4">
+            <h3 class="text-lg font-semibold text-gray-800">${product.title}</h3>
+            <p class="text-gray-600 text-sm mb-4">${product.description}</p>
+
+            <div class="mb-4" style="display:none;">
+                <p class="font-bold text-gray-800 text-xs">Standard: Rs. ${product.amountStandard}</p>
+                <p class="font-bold text-gray-800 text-xs">Premium: Rs. ${product.amountPremium}</p>
+                <p class="font-bold text-gray-800 text-xs">Deluxe: Rs. ${product.amountDeluxe}</p>
+            </div>
+
+            <!-- Display release date and time -->
+            <div class="mb-4">
+                <p class="font-bold text-gray-800 text-xs">Date: ${product.date}</p>
+                <p class="font-bold text-gray-800 text-xs">Time: ${product.time}</p>
+            </div>
+
+            <!-- Action Buttons: Buy Options -->
+            <div class="mt-4 flex space-x-2">
+                <button onclick="bookEvent(${product.event_id})" class="w-full bg-blue-500 text-white py-2 rounded-lg hover:bg-blue-600">Register</button>
+            </div>
+        `;
+
+        // <button onclick="goToPayment('${product.title}', ${product.amountStandard})" class="w-full bg-green-500 text-white py-2 rounded-lg hover:bg-green-600">Buy Standard</button>
+        //         <button onclick="goToPayment('${product.title}', ${product.amountPremium})" class="w-full bg-yellow-500 text-white py-2 rounded-lg hover:bg-yellow-600">Buy Premium</button>
+        //         <button onclick="goToPayment('${product.title}', ${product.amountDeluxe})" class="w-full bg-purple-500 text-white py-2 rounded-lg hover:bg-purple-600">Buy Deluxe</button>
+        container.appendChild(card);
+    });
+}
+
+function bookEvent(event_id) {
+
+    // Send the booking data to the server
+    fetch('/book_event', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            event_id
+        })
+    })
+    .then(handleBooking)
+    .catch(error => {
+        alert('Failed to register this event. Please try again later.')
+        console.error('Error:', error)
+    });
+}
+
+// 202 means the booking is in the waiting room: poll until it has been served
+function handleBooking(response) {
+    return response.json().then(data => {
+        if (response.status === 202) {
+            console.log(`Waiting for booking: position ${data.position}, about ${data.eta}s`)
+            setTimeout(() => {
+                fetch(`/booking_status?ticket=${data.ticket}`).then(handleBooking)
+            }, Math.min(Math.max(data.eta, 1), 5) * 1000)
+        } else if (response.ok) {
+            alert('Event registered successfully!')
+            console.log(data)
+        } else {
+            alert(data.message || 'Failed to register this event. Please try again later.')
+        }
+    })
+}
+
+// Function to redirect to the payment page with product and price info
+function goToPayment(productTitle, price) {
+    window.location.href = `/booking?product=${encodeURIComponent(productTitle)}&price=${price}`;
+}
+
+// Call loadProducts to display the saved products when the page loads
+loadProducts();
+
+// Toggle the mobile navbar
+document.getElementById('navbar-toggle').addEventListener('click', () => {
+    const menu = document.getElementById('navbarMenu');
+    menu.classList.toggle('hidden');
+});
@@ -0,0 +1,47 @@
+// Function to handle form submission
+document.getElementById('paymentForm').addEventListener('submit', function(event) {
+    event.preventDefault(); // Prevent page reload on form submit
+
+    // Get values from the form
+    const cardNumber = document.getElementById('cardNumber').value;
+    const expiryDate = document.getElementById('expiryDate').value;
+    const cvv = document.getElementById('cvv').value;
+    const status = document.getElementById('status').value;
+
+    // Create a payment object
+    const payment = {
+        cardNumber: cardNumber,
+        expiryDate: expiryDate,
+        cvv: cvv,
+        status: status
+    };
+
+    // Get current payments from localStorage or create an empty array if none exist
+    const payments = JSON.parse(localStorage.getItem('payments')) || [];
+
+    // Add the new payment to the list
+    payments.push(payment);
+
+    // Save updated payment data back to localStorage
+    localStorage.setItem('payments', JSON.stringify(payments));
+
+    // Update the displayed payment status in real-time
+    document.getElementById('statusDisplay').textContent = `Status: ${status}`;
+
+    // Display success message
+    document.getElementById('message').textContent = 'Payment information saved successfully!';
+    document.getElementById('message').classList.add('text-green-500');
+    document.getElementById('message').classList.remove('text-red-500');
+
+    // Clear the form
+    document.getElementById('paymentForm').reset();
+});
+
+// Optional: Load and display the last payment status when the page is loaded
+window.addEventListener('load', function() {
+    const payments = JSON.parse(localStorage.getItem('payments')) || [];
+    if (payments.length > 0) {
+        const lastPayment = payments[payments.length - 1];
+        document.getElementById('statusDisplay').textContent = `Status: ${lastPayment.status}`;
+    }
+});
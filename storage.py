@@ -0,0 +1,901 @@
+"""Shared data-access layer for the JSON data files.
+
+Every handler used to open and ``json.load`` its whole file on each request.
+The cache below keeps each file parsed in memory and only re-reads it when the
+file's inode, mtime or size changes on disk (or when it is written through the cache),
+so repeated reads of an unchanged file cost a single ``os.stat``.
+
+The app talks to a ``Storage`` rather than to files: ``JsonStorage`` keeps the
+collections in these JSON files, ``sqlite_storage.SqliteStorage`` keeps them in
+an indexed SQLite database. Both answer the same lookups, so handlers never
+scan a whole collection to find one user's records.
+
+Files can also be switched to write-ahead-log mode: instead of rewriting the
+whole JSON array for every booking or notification, each mutation is appended
+as one JSON line to ``<file>.log`` and the in-memory state is rebuilt from the
+snapshot plus the log at startup. The log is folded back into the snapshot
+file periodically, so a write costs O(1) no matter how long the history is.
+
+Several worker processes can share the files. Every mutation runs under a
+``FileLock`` (a thread lock plus ``flock`` on ``<file>.lock``), snapshots are
+written to a temp file and swapped in with ``os.replace`` so readers never see
+a half-written file, and mutations queued while another thread holds the lock
+are group-committed in one write.
+"""
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+import codec
+from metrics import Counter, Histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: files are only locked within the process
+    fcntl = None
+
+# Where the time of a request goes when it touches a data file
+STORAGE_SECONDS = Histogram(
+    "eventflow_storage_seconds", "Time spent reading, parsing, serializing and writing data files.",
+    ["file", "operation"],
+)
+STORAGE_BYTES = Counter(
+    "eventflow_storage_bytes_total", "Bytes read from and written to data files.", ["file", "direction"],
+)
+
+# A cached file: its on-disk version, a generation number that changes with
+# every new copy, the parsed data and a content digest usable as an ETag
+CacheEntry = namedtuple('CacheEntry', 'version generation data digest')
+
+
+def digest_of(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+
+# Identity of a file on disk; os.replace always produces a new inode
+def file_identity(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+# Write ``raw`` to ``path`` atomically: readers see the old or the new file, never a mix
+def replace_file(path, raw):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with STORAGE_SECONDS.time(file=os.path.basename(path), operation="write"):
+        with open(tmp_path, 'wb') as file:
+            file.write(raw)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    STORAGE_BYTES.inc(len(raw), file=os.path.basename(path), direction="written")
+
+
+# Read a whole data file, recording how long it took and how many bytes it had
+def read_file(path):
+    name = os.path.basename(path)
+    with STORAGE_SECONDS.time(file=name, operation="read"):
+        with open(path, 'rb') as file:
+            raw = file.read()
+    STORAGE_BYTES.inc(len(raw), file=name, direction="read")
+    return raw
+
+
+def parse_json(path, raw):
+    with STORAGE_SECONDS.time(file=os.path.basename(path), operation="parse"):
+        return codec.loads(raw)
+
+
+def dump_json(path, data):
+    with STORAGE_SECONDS.time(file=os.path.basename(path), operation="dump"):
+        return codec.dump_file(data)
+
+
+class FileLock:
+    """Re-entrant lock on a file, across threads and (through flock) processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._owner = None
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            if fcntl is not None:
+                if self._file is None:
+                    self._file = open(self.path, 'a')
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            self._owner = threading.get_ident()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def held(self):
+        """True if the calling thread holds the lock."""
+        return self._owner == threading.get_ident()
+
+
+class WriteAheadLog:
+    """Append-only JSON-lines log of mutations to one snapshot file.
+
+    The first line names the digest of the snapshot the log applies to. Any
+    process may append to the log while holding the file's lock; the others
+    pick the new lines up from ``offset`` on their next read.
+    """
+
+    def __init__(self, path, fsync_batch=64):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.records = 0  # Records in the log since the last compaction
+        self.base = None  # Digest of the snapshot the state was loaded from
+        self.valid = True  # False if the log belongs to another snapshot
+        self.offset = 0  # Bytes of the log applied so far
+        self.identity = None  # file_identity of the log when it was opened
+        self._unsynced = 0
+        self._file = None
+
+    def replay(self, data, snapshot_digest):
+        """Apply every complete record of the log to ``data`` and return it.
+
+        If the log was started from a different snapshot, a compaction
+        replaced the snapshot but crashed before resetting the log, and the
+        records are already part of the snapshot.
+        """
+        self.close()
+        self.records = 0
+        self.offset = 0
+        self.base = snapshot_digest
+        self.valid = True
+        self.identity = file_identity(self.path)
+        return self.catch_up(data)
+
+    def catch_up(self, data):
+        """Apply the records appended since the last replay or catch-up."""
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return data
+        start = time.perf_counter()
+        offset = self.offset
+        with file:
+            file.seek(self.offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # Torn or in-progress write; picked up later if it completes
+                self.offset += len(line)
+                record = codec.loads(line)
+                if record["op"] == "base":
+                    self.valid = record["snapshot"] == self.base
+                elif self.valid:
+                    data = apply_record(data, record)
+                    self.records += 1
+        name = os.path.basename(self.path)
+        STORAGE_SECONDS.observe(time.perf_counter() - start, file=name, operation="replay")
+        STORAGE_BYTES.inc(self.offset - offset, file=name, direction="read")
+        return data
+
+    def write(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        line = codec.dump_line(record)
+        with STORAGE_SECONDS.time(file=os.path.basename(self.path), operation="append"):
+            self._file.write(line)
+            self._file.flush()
+        STORAGE_BYTES.inc(len(line), file=os.path.basename(self.path), direction="written")
+        self.offset += len(line)
+        self.identity = file_identity(self.path)
+        self.records += 1
+        self._unsynced += 1
+        # Group commit: fsync once per batch, the flusher picks up the rest
+        if self._unsynced >= self.fsync_batch:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            with STORAGE_SECONDS.time(file=os.path.basename(self.path), operation="fsync"):
+                os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def reset(self, snapshot_digest):
+        """Start an empty log on top of the snapshot with ``snapshot_digest``."""
+        self.close()
+        line = codec.dump_line({"op": "base", "snapshot": snapshot_digest})
+        replace_file(self.path, line)
+        self.records = 0
+        self.offset = len(line)
+        self.base = snapshot_digest
+        self.valid = True
+        self.identity = file_identity(self.path)
+
+    def digest(self):
+        # Identifies the snapshot plus the records applied on top of it
+        return f"{self.base}+{self.offset}"
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+# Apply one log record to a list of items
+def apply_record(data, record):
+    op = record["op"]
+    if op == "append":
+        data.extend(record["items"])
+        return data
+    if op == "remove":
+        positions = set(record["positions"])
+        return [item for index, item in enumerate(data) if index not in positions]
+    raise ValueError(f"Unknown log operation: {op}")
+
+
+class PendingMutation:
+    """A change waiting for the group commit of its file."""
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class JsonFileCache:
+    """In-process cache of parsed JSON files, validated by mtime and size."""
+
+    def __init__(self):
+        self._entries = {}  # path -> CacheEntry
+        self._wal = {}  # path -> WriteAheadLog, for files in WAL mode
+        self._snapshots = {}  # path -> file_identity of the snapshot a WAL state was built from
+        self._file_locks = {}
+        self._pending = {}  # path -> [PendingMutation], waiting for a group commit
+        self._committers = set()  # Paths a thread is currently group-committing
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._flusher = None
+        self.hits = 0
+        self.misses = 0
+        self.commits = 0
+        self.mutations = 0
+        self.compact_every = 1000
+
+    # Version of a file on disk: changes whenever the file is rewritten
+    @staticmethod
+    def _file_version(path):
+        # The inode matters: every os.replace makes a new one, so a rewrite by
+        # another process is noticed even with the same size and mtime tick
+        identity = file_identity(path)
+        if identity is None:
+            raise FileNotFoundError(f"No such file: {path}")
+        return identity
+
+    def _store(self, path, version, data, digest):
+        # Every new copy of a file gets a fresh generation, which is what
+        # indexes and other derived values are keyed on
+        with self._lock:
+            self._generation += 1
+            entry = CacheEntry(version, self._generation, data, digest)
+            self._entries[path] = entry
+        return entry
+
+    def enable_wal(self, paths, fsync_batch=64, fsync_interval=0.05, compact_every=1000, compact_interval=60):
+        """Keep ``paths`` in write-ahead-log mode.
+
+        Appends are flushed to the OS immediately and fsynced every
+        ``fsync_batch`` records or ``fsync_interval`` seconds, whichever comes
+        first. The log is compacted into the snapshot after ``compact_every``
+        records or every ``compact_interval`` seconds.
+        """
+        self.compact_every = compact_every
+        for path in paths:
+            self._wal[path] = WriteAheadLog(path + '.log', fsync_batch)
+            self.invalidate(path)
+
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, args=(fsync_interval, compact_interval), daemon=True
+            )
+            self._flusher.start()
+            atexit.register(self.sync)
+
+    def sync(self):
+        """Fsync every write-ahead log now."""
+        for path, wal in list(self._wal.items()):
+            with self.locked(path):
+                wal.sync()
+
+    def _flush_loop(self, fsync_interval, compact_interval):
+        last_compaction = time.monotonic()
+        while True:
+            time.sleep(fsync_interval)
+            self.sync()
+            if time.monotonic() - last_compaction >= compact_interval:
+                self.compact()
+                last_compaction = time.monotonic()
+
+    def locked(self, path):
+        """Hold the write lock of ``path`` (threads and processes) across a read-modify-write."""
+        with self._lock:
+            lock = self._file_locks.get(path)
+            if lock is None:
+                lock = self._file_locks[path] = FileLock(path + '.lock')
+        return lock
+
+    def load(self, path):
+        """Return the parsed contents of ``path``.
+
+        The returned object is shared between callers, so treat it as
+        read-only; change files through ``save``, ``append`` and ``remove``.
+        Raises ``FileNotFoundError`` / ``json.JSONDecodeError`` like
+        ``json.load`` would.
+        """
+        return self._get(path).data
+
+    def _get(self, path):
+        # Current CacheEntry of ``path``
+        if path in self._wal:
+            return self._get_wal(path)
+
+        version = self._file_version(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.version == version:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        raw = read_file(path)
+        data = parse_json(path, raw)
+
+        return self._store(path, version, data, digest_of(raw))
+
+    def _get_wal(self, path):
+        # The in-memory state is the snapshot plus the log. It is rebuilt when
+        # another process compacted (replacing both files) and otherwise only
+        # catches up with lines other processes appended.
+        wal = self._wal[path]
+        entry = self._entries.get(path)
+        if (entry is not None and self._snapshots.get(path) == file_identity(path)
+                and wal.identity == file_identity(wal.path)):
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        with self.locked(path):
+            entry = self._entries.get(path)
+            snapshot = file_identity(path)
+            if entry is not None and self._snapshots.get(path) == snapshot:
+                if wal.identity == file_identity(wal.path):
+                    return entry
+                # Same log, more lines: apply just those
+                log = file_identity(wal.path)
+                if wal.identity is not None and log is not None and wal.identity[0] == log[0]:
+                    offset = wal.offset
+                    data = wal.catch_up(entry.data)
+                    wal.identity = log
+                    if wal.offset == offset:
+                        return entry
+                    return self._store(path, None, data, wal.digest())
+
+            with self._lock:
+                self.misses += 1
+            try:
+                raw = read_file(path)
+                data = parse_json(path, raw)
+            except FileNotFoundError:
+                raw, data = b'', []
+            self._snapshots[path] = snapshot
+            data = wal.replay(data, digest_of(raw))
+            return self._store(path, None, data, wal.digest())
+
+    def save(self, path, data):
+        """Write ``data`` to ``path`` and keep it as the cached copy."""
+        with self.locked(path):
+            if path in self._wal:
+                self._replace_snapshot(path, data)
+            else:
+                self._write_snapshot(path, data)
+
+    def _write_snapshot(self, path, data):
+        raw = dump_json(path, data)
+        replace_file(path, raw)
+        self._store(path, self._file_version(path), data, digest_of(raw))
+
+    def _replace_snapshot(self, path, data):
+        # Swap in the snapshot of a WAL file, then start a new log on top of it
+        raw = dump_json(path, data)
+        replace_file(path, raw)
+        self._snapshots[path] = file_identity(path)
+        wal = self._wal[path]
+        wal.reset(digest_of(raw))
+        self._store(path, None, data, wal.digest())
+
+    def _commit(self, path, apply):
+        """Run ``apply(data) -> (data, result)`` against ``path`` and persist it.
+
+        The first thread to queue a mutation becomes the committer: it takes
+        the file lock and writes everything queued so far in one snapshot
+        rewrite, again and again until the queue is empty. Mutations queued
+        meanwhile by other threads just wait for their batch to be written.
+        """
+        mutation = PendingMutation(apply)
+        lock = self.locked(path)
+        if lock.held():
+            # Already inside a read-modify-write of this file: apply right away
+            self._commit_batch(path, [mutation])
+        else:
+            with self._lock:
+                self._pending.setdefault(path, []).append(mutation)
+                committer = path not in self._committers
+                self._committers.add(path)
+
+            while committer:
+                with lock:
+                    with self._lock:
+                        batch = self._pending.pop(path, [])
+                        if not batch:
+                            self._committers.discard(path)
+                            break
+                    self._commit_batch(path, batch)
+
+        mutation.done.wait()
+        if mutation.error is not None:
+            raise mutation.error
+        return mutation.result
+
+    def _commit_batch(self, path, batch):
+        try:
+            try:
+                data = list(self.load(path))
+            except FileNotFoundError:
+                data = []
+            for mutation in batch:
+                try:
+                    data, mutation.result = mutation.apply(data)
+                except Exception as e:
+                    mutation.error = e
+            self._write_snapshot(path, data)
+            with self._lock:
+                self.commits += 1
+                self.mutations += len(batch)
+        except Exception as e:
+            for mutation in batch:
+                mutation.error = e
+        finally:
+            for mutation in batch:
+                mutation.done.set()
+
+    def append(self, path, items, prepare=None):
+        """Add ``items`` to the end of the list stored in ``path``.
+
+        ``prepare(items)``, if given, runs under the file lock right before the
+        items are added, e.g. to give them ids in file order.
+        """
+        if path not in self._wal:
+            def apply(data):
+                if prepare is not None:
+                    prepare(items)
+                data.extend(items)
+                return data, None
+            self._commit(path, apply)
+            return
+
+        with self.locked(path):
+            data = self._writable_wal(path)
+            if prepare is not None:
+                prepare(items)
+            wal = self._wal[path]
+            wal.write({"op": "append", "items": list(items)})
+            data.extend(items)
+            self._store(path, None, data, wal.digest())
+            if wal.records >= self.compact_every:
+                self._compact(path)
+
+    def remove(self, path, predicate):
+        """Remove the items of ``path`` matching ``predicate``; return how many."""
+        def positions_of(data):
+            return [index for index, item in enumerate(data) if predicate(item)]
+
+        if path not in self._wal:
+            def apply(data):
+                removed = set(positions_of(data))
+                if not removed:
+                    return data, 0
+                return [item for index, item in enumerate(data) if index not in removed], len(removed)
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return self._commit(path, apply)
+
+        with self.locked(path):
+            data = self._writable_wal(path)
+            positions = positions_of(data)
+            if not positions:
+                return 0
+            wal = self._wal[path]
+            wal.write({"op": "remove", "positions": positions})
+            data = apply_record(data, {"op": "remove", "positions": positions})
+            self._store(path, None, data, wal.digest())
+            return len(positions)
+
+    def update(self, path, predicate, changes):
+        """Set ``changes`` on the items of ``path`` matching ``predicate``; return how many."""
+        def apply(data):
+            updated = 0
+            for index, item in enumerate(data):
+                if predicate(item):
+                    data[index] = dict(item, **changes)
+                    updated += 1
+            return data, updated
+
+        if path not in self._wal:
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return self._commit(path, apply)
+
+        # The log has no record for an update: rewrite the snapshot under the lock
+        with self.locked(path):
+            data, updated = apply(list(self._writable_wal(path)))
+            if updated:
+                self._replace_snapshot(path, data)
+            return updated
+
+    def _writable_wal(self, path):
+        # Latest state of a WAL file, with a log that new records can go to.
+        # Must be called with the file lock held.
+        data = self._get_wal(path).data
+        wal = self._wal[path]
+        if not wal.valid:
+            # The log belongs to an older snapshot (crash during compaction):
+            # start a fresh one instead of appending where replay would skip
+            self._replace_snapshot(path, data)
+            data = self._get_wal(path).data
+        return data
+
+    def compact(self):
+        """Fold the write-ahead logs back into their snapshot files."""
+        for path in list(self._wal):
+            with self.locked(path):
+                self._compact(path)
+
+    def _compact(self, path):
+        data = self._get_wal(path).data
+        if not self._wal[path].records:
+            return
+        self._replace_snapshot(path, data)
+
+    def version(self, path):
+        """Generation of the cached copy of ``path``; changes whenever the file does."""
+        return self._get(path).generation
+
+    def digest(self, path):
+        """Content digest of ``path``, the same in every process that reads it."""
+        return self._get(path).digest
+
+    def invalidate(self, path=None):
+        """Drop one cached file (or all of them) so the next load re-reads it."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self):
+        """Hit/miss counters, group-commit counters and the files held in memory."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "commits": self.commits,
+                "mutations": self.mutations,
+                "files": sorted(self._entries),
+                "wal": {path: wal.records for path, wal in self._wal.items()},
+            }
+
+
+class IdSequence:
+    """Persistent, monotonic id counters, one per collection.
+
+    Ids used to be ``len(data) + 1``, which repeats after a cancellation
+    shrinks the list. The last id handed out per collection is kept in a
+    small JSON counter file that is updated under a ``FileLock``, so every
+    process sharing the file gets distinct, increasing ids. ``allocate``
+    reserves a whole range in one locked step, so bulk inserts pay for the
+    lock once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = FileLock(path + '.lock')
+        self._checked = set()  # Collections whose counter was checked against the data
+
+    def _read(self):
+        try:
+            with open(self.path, 'rb') as file:
+                return codec.loads(file.read())
+        except FileNotFoundError:
+            return {}
+
+    def allocate(self, collection, count=1, current_max=None):
+        """Reserve ``count`` consecutive ids for ``collection``; return the first.
+
+        ``current_max`` returns the highest id already stored. It is consulted
+        the first time a collection is used in this process, so a missing or
+        stale counter file (e.g. after a crash) never hands out existing ids.
+        """
+        with self._lock:
+            counters = self._read()
+            last = counters.get(collection, 0)
+            if collection not in self._checked and current_max is not None:
+                last = max(last, current_max())
+                self._checked.add(collection)
+            counters[collection] = last + count
+            replace_file(self.path, codec.dump_file(counters))
+        return last + 1
+
+    def reserve(self, collection, last_id):
+        """Never hand out ids up to ``last_id`` for ``collection``."""
+        with self._lock:
+            counters = self._read()
+            if counters.get(collection, 0) < last_id:
+                counters[collection] = last_id
+                replace_file(self.path, codec.dump_file(counters))
+
+# Highest value of ``id_field`` among ``records``
+def max_id(records, id_field):
+    ids = [record.get(id_field) for record in records]
+    return max((value for value in ids if isinstance(value, int)), default=0)
+
+
+# Record fields that lookups filter on; both backends keep an index for each
+INDEXED_FIELDS = {
+    "users": ("username",),
+    "events": ("event_id",),
+    "bookings": ("user_email", "event_id"),
+    "notifications": ("user_email",),
+}
+
+# Field holding the sequential id of new records, per collection
+ID_FIELDS = {
+    "events": "event_id",
+    "bookings": "booking_id",
+    "notifications": "notification_id",
+}
+
+
+def matches(record, criteria):
+    return all(record.get(field) == value for field, value in criteria.items())
+
+
+class Storage:
+    """Interface of the persistence backends used by the app.
+
+    Collections are lists of JSON objects ("users", "events", "bookings",
+    "notifications"). Lists returned by ``all`` and ``find`` are shared and
+    must not be modified by callers.
+    """
+
+    # How often waiters re-check versions, to notice writes by other processes
+    change_poll_interval = 1.0
+
+    def __init__(self):
+        self._derived = {}  # (name, collections) -> (versions, value)
+        self._derived_lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    def all(self, collection):
+        """Every record of ``collection``, in insertion order."""
+        raise NotImplementedError
+
+    def find(self, collection, **criteria):
+        """Records whose fields equal ``criteria``, using an index when one exists."""
+        raise NotImplementedError
+
+    def find_one(self, collection, **criteria):
+        found = self.find(collection, **criteria)
+        return found[0] if found else None
+
+    def insert(self, collection, record):
+        """Add ``record``, assigning its id field if the collection has one."""
+        return self.insert_many(collection, [record])[0]
+
+    def insert_many(self, collection, records):
+        """Add several records in a single write; returns them with their ids."""
+        raise NotImplementedError
+
+    def delete(self, collection, **criteria):
+        """Delete the records matching ``criteria``; return how many."""
+        raise NotImplementedError
+
+    def delete_where(self, collection, predicate):
+        """Delete the records for which ``predicate(record)`` is true, in one write; return how many."""
+        raise NotImplementedError
+
+    def update(self, collection, changes, **criteria):
+        """Set the fields in ``changes`` on the records matching ``criteria``, in one write; return how many."""
+        raise NotImplementedError
+
+    def reserve_ids(self, collection, last_id):
+        """Never assign ids up to ``last_id`` to new records, e.g. ids of records moved elsewhere."""
+        raise NotImplementedError
+
+    def replace_all(self, collection, records):
+        """Replace the whole collection with ``records``."""
+        raise NotImplementedError
+
+    def version(self, collection):
+        """Opaque token that changes whenever ``collection`` changes."""
+        raise NotImplementedError
+
+    def etag(self, collection):
+        """Validator for HTTP caching of responses built from ``collection``.
+
+        Unlike ``version`` it must mean the same thing in every worker process.
+        """
+        return f"{collection}-{self.version(collection)}"
+
+    def changed(self):
+        """Wake up ``wait_for_change`` callers; backends call it after every write."""
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, collection, version, timeout):
+        """Block until ``collection`` moves past ``version`` or ``timeout`` runs out.
+
+        Returns True if it changed. Writes from this process wake waiters up
+        immediately, writes from other processes within ``change_poll_interval``.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.version(collection) == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(min(remaining, self.change_poll_interval))
+        return True
+
+    def compact(self):
+        """Fold logs back into the main data files."""
+
+    def stats(self):
+        return {}
+
+    def derive(self, name, collections, build):
+        """Return ``build(*records)`` for ``collections``, memoised per version.
+
+        Used for indexes and joins computed from whole collections: the value
+        is rebuilt only after one of the collections changed.
+        """
+        versions = tuple(self.version(collection) for collection in collections)
+        key = (name, tuple(collections))
+        with self._derived_lock:
+            entry = self._derived.get(key)
+            if entry is not None and entry[0] == versions:
+                return entry[1]
+
+        value = build(*(self.all(collection) for collection in collections))
+        with self._derived_lock:
+            self._derived[key] = (versions, value)
+        return value
+
+
+# Group the records of a collection by the value of ``field``
+def build_index(field):
+    def build(records):
+        index = {}
+        for record in records:
+            try:
+                index.setdefault(record.get(field), []).append(record)
+            except TypeError:
+                continue  # An unhashable value (e.g. a list) can never be looked up
+        return index
+    return build
+
+
+class JsonStorage(Storage):
+    """Storage backed by one JSON file per collection, through a JsonFileCache."""
+
+    def __init__(self, files, cache, sequence):
+        super().__init__()
+        self.files = files  # collection -> path
+        self.cache = cache
+        self.sequence = sequence  # IdSequence handing out record ids
+
+    def all(self, collection):
+        try:
+            return self.cache.load(self.files[collection])
+        except FileNotFoundError:
+            return []
+
+    def version(self, collection):
+        try:
+            return self.cache.version(self.files[collection])
+        except FileNotFoundError:
+            return 0
+
+    def etag(self, collection):
+        try:
+            return self.cache.digest(self.files[collection])
+        except FileNotFoundError:
+            return "empty"
+
+    def find(self, collection, **criteria):
+        indexed = [field for field in criteria if field in INDEXED_FIELDS.get(collection, ())]
+        if not indexed:
+            return [record for record in self.all(collection) if matches(record, criteria)]
+
+        # Narrow down through the in-memory index, then check the other fields
+        field = indexed[0]
+        index = self.derive(f"index:{field}", [collection], build_index(field))
+        candidates = index.get(criteria[field], [])
+        if len(criteria) == 1:
+            return candidates
+        return [record for record in candidates if matches(record, criteria)]
+
+    def insert_many(self, collection, records):
+        id_field = ID_FIELDS.get(collection)
+
+        # Ids are allocated under the file lock, so the file stays in id order
+        def assign_ids(records):
+            if id_field and records:
+                next_id = self.sequence.allocate(
+                    collection, len(records), lambda: max_id(self.all(collection), id_field)
+                )
+                for offset, record in enumerate(records):
+                    record[id_field] = next_id + offset
+
+        # One rewrite (or one log record) for the whole batch
+        self.cache.append(self.files[collection], records, prepare=assign_ids)
+        self.changed()
+        return records
+
+    def delete(self, collection, **criteria):
+        return self.delete_where(collection, lambda record: matches(record, criteria))
+
+    def delete_where(self, collection, predicate):
+        try:
+            removed = self.cache.remove(self.files[collection], predicate)
+        except FileNotFoundError:
+            return 0
+        self.changed()
+        return removed
+
+    def update(self, collection, changes, **criteria):
+        try:
+            updated = self.cache.update(self.files[collection], lambda record: matches(record, criteria), changes)
+        except FileNotFoundError:
+            return 0
+        self.changed()
+        return updated
+
+    def reserve_ids(self, collection, last_id):
+        # Stored ids too, in case the counter file is missing
+        self.sequence.reserve(collection, max(last_id, max_id(self.all(collection), ID_FIELDS[collection])))
+
+    def replace_all(self, collection, records):
+        self.cache.save(self.files[collection], list(records))
+        self.changed()
+
+    def compact(self):
+        self.cache.compact()
+
+    def stats(self):
+        return dict(self.cache.stats(), backend="json")
+
+
+# Shared cache used by the Flask app
+cache = JsonFileCache()
@@ -0,0 +1,74 @@
+"""Archiving: ids are never reused, bookings keep their month, seats leave the inventory."""
+import pytest
+
+from archive import Archive, archive_data
+from inventory import SeatInventory, count_bookings
+from sqlite_storage import SqliteStorage
+from storage import IdSequence, JsonFileCache, JsonStorage
+
+EVENTS = [
+    {"event_id": 1, "title": "Future", "date": "2099-01-01"},
+    {"event_id": 2, "title": "Also past", "date": "2025-04-02"},
+    {"event_id": 3, "title": "Past", "date": "2025-03-10", "capacityStandard": 5},
+]
+
+
+def open_storage(directory, backend):
+    if backend == "sqlite":
+        return SqliteStorage(str(directory / "eventflow.db"))
+    files = {}
+    for collection in ("events", "bookings", "notifications"):
+        files[collection] = str(directory / f"{collection}.json")
+        (directory / f"{collection}.json").write_text("[]")
+    return JsonStorage(files, JsonFileCache(), IdSequence(str(directory / "sequences.json")))
+
+
+# Data with ids but no id counters yet, as after import-json
+@pytest.fixture(params=["json", "sqlite"])
+def db(request, tmp_path):
+    db = open_storage(tmp_path, request.param)
+    db.replace_all("events", [dict(event) for event in EVENTS])
+    db.replace_all("bookings", [
+        {"booking_id": event["event_id"], "event_id": event["event_id"], "user_email": "a@example.com", "booked_at": "2025-01-05T10:00"}
+        for event in EVENTS
+    ])
+    return db
+
+
+def test_archived_ids_are_not_reused(db, tmp_path):
+    # The highest ids are archived: a counter taken from the live rows would hand them out again
+    archive_data(db, Archive(str(tmp_path / "archive")), "2026-01-01", "2026-01-01")
+    event = db.insert("events", {"title": "New", "date": "2099-02-01"})
+    booking = db.insert("bookings", {"event_id": event["event_id"], "user_email": "b@example.com"})
+    assert event["event_id"] == len(EVENTS) + 1
+    assert booking["booking_id"] == len(EVENTS) + 1
+
+
+def test_rerun_files_bookings_under_their_event_month(db, tmp_path):
+    archive = Archive(str(tmp_path / "archive"))
+    archive_data(db, archive, "2026-01-01", "2026-01-01")
+    # A booking whose event an earlier run already moved, e.g. one interrupted before the bookings
+    past = archive.read("events", "2025-03")[0]
+    db.insert("bookings", {"event_id": past["event_id"], "user_email": "late@example.com"})
+
+    moved = archive_data(db, archive, "2026-01-01", "2026-01-01")
+    assert moved["bookings"] == 1
+    assert [booking["user_email"] for booking in archive.read("bookings", "2025-03")] == ["a@example.com", "late@example.com"]
+    assert archive.read("bookings", "undated") == []
+
+
+def test_archived_events_leave_the_seat_inventory(db, tmp_path):
+    seats = SeatInventory(str(tmp_path / "seats"), lambda event_id: db.find("bookings", event_id=event_id), stripes=2)
+    events = db.all("events")
+    seats.summary([event["event_id"] for event in events])  # Seeds every event
+    bookings = list(db.all("bookings"))
+
+    archive = Archive(str(tmp_path / "archive"))
+    archive_data(db, archive, "2026-01-01", "2026-01-01", seats)
+    live = [event["event_id"] for event in db.all("events")]
+    assert sorted(event_id for log in seats._logs.values() for event_id in log.events) == live
+    # Archived bookings still count per day, now and after a rebuild
+    assert seats.summary(live)[1] == count_bookings(bookings)[1]
+    seats.rebuild(db.all("bookings"), archive.all("bookings"))
+    assert sorted(event_id for log in seats._logs.values() for event_id in log.events) == live
+    assert seats.summary(live)[1] == count_bookings(bookings)[1]
@@ -0,0 +1,26 @@
+"""JSONProvider: responses are byte for byte those of Flask's own provider."""
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from codec import JSONProvider
+
+RECORDS = [
+    {"title": "Café ☕ 😀", "prices": [1, 2.5, None, True]},
+    {"title": "plain", "tags": {"b": [], "a": "x"}},
+]
+
+
+@pytest.mark.parametrize("debug", [False, True])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_responses_match_flask(debug, ensure_ascii):
+    app = Flask(__name__)
+    app.debug = debug
+    app.json = JSONProvider(app)
+    app.json.ensure_ascii = ensure_ascii
+    reference = DefaultJSONProvider(app)
+    reference.ensure_ascii = ensure_ascii
+    with app.app_context():
+        for record in RECORDS:
+            assert app.json.response(record).get_data() == reference.response(record).get_data()
+            assert app.json.dumps(record) == reference.dumps(record)  # E.g. tojson in templates
@@ -0,0 +1,65 @@
+"""Seat inventory: no tier is ever sold beyond its capacity, across processes."""
+import multiprocessing
+
+import pytest
+
+from inventory import AlreadyBooked, SeatInventory, SoldOut, count_bookings
+
+EVENT = {"event_id": 7, "capacityStandard": 10, "capacityPremium": 3}
+
+
+def no_bookings(event_id):
+    return []
+
+
+def book_many(directory, worker, count, results):
+    seats = SeatInventory(str(directory), no_bookings, stripes=4)
+    sold = 0
+    for index in range(count):
+        try:
+            seats.reserve(EVENT, f"user{worker}-{index}@example.com", "standard")
+            sold += 1
+        except SoldOut:
+            pass
+    results.put(sold)
+
+
+def test_processes_never_oversell(tmp_path):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [context.Process(target=book_many, args=(tmp_path, worker, 25, results)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    sold = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(60)
+
+    assert sum(sold) == 10
+    availability = SeatInventory(str(tmp_path), no_bookings, stripes=4).availability(EVENT)
+    assert availability["standard"] == {"capacity": 10, "sold": 10, "left": 0}
+
+
+def test_one_seat_per_user_and_release(tmp_path):
+    seats = SeatInventory(str(tmp_path), no_bookings, stripes=4)
+    seats.reserve(EVENT, "a@example.com", "premium", day="2025-03-01")
+    with pytest.raises(AlreadyBooked):
+        seats.reserve(EVENT, "a@example.com", "standard")
+
+    assert seats.release(7, "a@example.com")
+    assert not seats.release(7, "a@example.com")
+    seats.reserve(EVENT, "a@example.com", "standard", day="2025-03-02")
+    assert seats.summary([7]) == ({7: {"premium": 0, "standard": 1}}, {"2025-03-02": 1})
+
+
+def test_seeds_from_bookings_and_rebuild_matches(tmp_path):
+    bookings = [
+        {"event_id": 7, "user_email": "a@example.com", "tier": "premium", "booked_at": "2025-03-01T10:00"},
+        {"event_id": 7, "user_email": "b@example.com", "booked_at": "2025-03-01T11:00"},
+        {"event_id": 7, "user_email": "b@example.com"},  # A duplicate from before the check existed
+    ]
+    seats = SeatInventory(str(tmp_path), lambda event_id: bookings, stripes=4)
+    assert seats.availability(EVENT)["premium"]["left"] == 2
+    assert seats.summary([7]) == count_bookings(bookings)
+
+    seats.rebuild(bookings[:1])
+    assert seats.summary([7]) == ({7: {"premium": 1}}, {"2025-03-01": 1})
@@ -0,0 +1,115 @@
+"""EmailQueue against a local SMTP sink."""
+import socketserver
+import threading
+
+import pytest
+
+from mailer import EmailQueue
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to take messages; refuses the first ``failures`` of them."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, failures=0):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.failures = failures
+        self.messages = []
+        self.lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command.startswith("MAIL"):
+                recipients = []
+                self.reply("250 OK")
+            elif command.startswith("RCPT"):
+                recipients.append(line.decode().strip()[8:].strip("<>"))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b".\r\n", b""):
+                        break
+                    data.append(line)
+                with self.server.lock:
+                    if self.server.failures:
+                        self.server.failures -= 1
+                        self.reply("451 try again later")
+                        continue
+                    self.server.messages.append((recipients, b"".join(data).decode()))
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def sink(request):
+    server = SMTPSink(getattr(request, "param", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def email_queue(sink, **options):
+    return EmailQueue("127.0.0.1", sink.server_address[1], starttls=False, sender="events@example.com", **options)
+
+
+def test_queued_messages_arrive(sink):
+    emails = email_queue(sink)
+    emails.enqueue("a@example.com", "First", "Hello A")
+    emails.enqueue("b@example.com", "Second", "Hello B")
+    emails.join()
+
+    assert sorted(recipients[0] for recipients, _ in sink.messages) == ["a@example.com", "b@example.com"]
+    assert any("Subject: First" in data and "Hello A" in data for _, data in sink.messages)
+    assert emails.stats()["sent"] == 2
+    assert emails.depth() == 0
+
+
+@pytest.mark.parametrize("sink", [2], indirect=True)
+def test_failed_sends_are_retried(sink):
+    emails = email_queue(sink, workers=1, backoff=0.01)
+    emails.enqueue("a@example.com", "Retried", "Hello")
+    emails.join()
+
+    assert [recipients for recipients, _ in sink.messages] == [["a@example.com"]]
+    stats = emails.stats()
+    assert (stats["sent"], stats["retried"], stats["failed"]) == (1, 2, 0)
+
+
+@pytest.mark.parametrize("sink", [10], indirect=True)
+def test_gives_up_after_max_attempts(sink):
+    emails = email_queue(sink, workers=1, backoff=0.01, max_attempts=3)
+    emails.enqueue("a@example.com", "Lost", "Hello")
+    emails.join()
+
+    assert sink.messages == []
+    assert emails.stats()["failed"] == 1
+
+
+def test_rejects_invalid_addresses(sink):
+    emails = email_queue(sink)
+    with pytest.raises(ValueError):
+        emails.enqueue("a@example.com\r\nBcc: b@example.com", "Injected", "Hello")
@@ -0,0 +1,64 @@
+"""Scheduler journal: jobs survive a restart and fire once, in due order."""
+import multiprocessing
+import threading
+import time
+
+from scheduler import Scheduler
+
+
+def schedule_then_exit(path, start):
+    # A process that fires the first job, leaves three pending and dies
+    fired = threading.Event()
+    scheduler = Scheduler(path, lambda jobs: fired.set(), catch_up_interval=0.05)
+    scheduler.schedule(start, {"name": "now"})
+    scheduler.schedule(start + 1.2, {"name": "third"})
+    scheduler.schedule(start + 0.8, {"name": "first"})
+    scheduler.schedule(start + 1.0, {"name": "second"})
+    assert fired.wait(5)
+    deadline = time.monotonic() + 5
+    while scheduler.depth() < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)  # The dispatcher reads the other three from the journal
+    assert scheduler.depth() == 3
+
+
+def collect(path, count):
+    fired = []
+    done = threading.Event()
+
+    def fire(jobs):
+        fired.extend(job["name"] for job in jobs)
+        if len(fired) >= count:
+            done.set()
+
+    scheduler = Scheduler(path, fire, catch_up_interval=0.05)
+    scheduler.start()
+    return scheduler, fired, done
+
+
+def test_pending_jobs_fire_after_restart(tmp_path):
+    path = str(tmp_path / "reminders.log")
+    process = multiprocessing.get_context("fork").Process(target=schedule_then_exit, args=(path, time.time()))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+
+    scheduler, fired, done = collect(path, 3)
+    assert done.wait(5)
+    time.sleep(0.2)  # Nothing else is due
+    assert fired == ["first", "second", "third"]
+    assert scheduler.stats()["pending"] == 0
+
+
+def test_jobs_from_another_process_are_picked_up(tmp_path):
+    path = str(tmp_path / "reminders.log")
+    scheduler, fired, done = collect(path, 1)
+    time.sleep(0.1)  # This process is the leader now
+
+    other = multiprocessing.get_context("fork").Process(
+        target=lambda: Scheduler(path, None)._append([{"op": "add", "id": "x", "due": time.time(), "job": {"name": "x"}}])
+    )
+    other.start()
+    other.join(10)
+
+    assert done.wait(5)
+    assert fired == ["x"]
@@ -0,0 +1,102 @@
+"""Concurrent writes to the JSON storage, in snapshot and write-ahead-log mode."""
+import json
+import multiprocessing
+import threading
+
+import pytest
+
+from storage import IdSequence, JsonFileCache, JsonStorage
+
+
+def open_storage(directory, wal):
+    files = {"bookings": str(directory / "booking.json")}
+    cache = JsonFileCache()
+    if wal:
+        cache.enable_wal(list(files.values()), compact_every=50)
+    return JsonStorage(files, cache, IdSequence(str(directory / "sequences.json")))
+
+
+def insert_bookings(directory, wal, worker, count):
+    db = open_storage(directory, wal)
+    for index in range(count):
+        db.insert("bookings", {"event_id": 1, "user_email": f"user{worker}-{index}@example.com"})
+    db.cache.sync()
+
+
+def check_bookings(db, expected):
+    bookings = db.all("bookings")
+    ids = [booking["booking_id"] for booking in bookings]
+    assert len(bookings) == expected
+    assert len(set(ids)) == expected
+    assert ids == sorted(ids)  # Ids are allocated under the file lock, so the file stays in id order
+    assert len({booking["user_email"] for booking in bookings}) == expected
+
+
+@pytest.mark.parametrize("wal", [False, True], ids=["snapshot", "wal"])
+def test_concurrent_threads_get_unique_ids(tmp_path, wal):
+    (tmp_path / "booking.json").write_text("[]")
+    db = open_storage(tmp_path, wal)
+
+    def worker(number):
+        for index in range(50):
+            db.insert("bookings", {"event_id": 1, "user_email": f"user{number}-{index}@example.com"})
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    check_bookings(db, 400)
+    # What is on disk (snapshot plus log) matches what this process sees
+    check_bookings(open_storage(tmp_path, wal), 400)
+
+
+@pytest.mark.parametrize("wal", [False, True], ids=["snapshot", "wal"])
+def test_concurrent_processes_get_unique_ids(tmp_path, wal):
+    (tmp_path / "booking.json").write_text("[]")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=insert_bookings, args=(tmp_path, wal, number, 40)) for number in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    check_bookings(open_storage(tmp_path, wal), 160)
+
+
+def test_wal_replays_after_restart(tmp_path):
+    (tmp_path / "booking.json").write_text("[]")
+    db = open_storage(tmp_path, wal=True)
+    for index in range(10):
+        db.insert("bookings", {"event_id": 1, "user_email": f"user{index}@example.com"})
+    db.delete("bookings", user_email="user3@example.com")
+    db.cache.sync()
+
+    # Not compacted yet: the snapshot is still empty and the log holds the changes
+    assert json.loads((tmp_path / "booking.json").read_text()) == []
+    restarted = open_storage(tmp_path, wal=True)
+    assert [booking["user_email"] for booking in restarted.all("bookings")] == [
+        f"user{index}@example.com" for index in range(10) if index != 3
+    ]
+
+
+@pytest.mark.parametrize("wal", [False, True], ids=["snapshot", "wal"])
+def test_update_keeps_concurrent_inserts(tmp_path, wal):
+    (tmp_path / "booking.json").write_text("[]")
+    db = open_storage(tmp_path, wal)
+    db.insert("bookings", {"event_id": 1, "user_email": "first@example.com"})
+
+    def insert():
+        for index in range(50):
+            db.insert("bookings", {"event_id": 2, "user_email": f"user{index}@example.com"})
+
+    thread = threading.Thread(target=insert)
+    thread.start()
+    updated = [db.update("bookings", {"tier": "premium"}, user_email="first@example.com") for _ in range(20)]
+    thread.join()
+
+    assert updated == [1] * 20
+    assert db.find_one("bookings", user_email="first@example.com")["tier"] == "premium"
+    check_bookings(open_storage(tmp_path, wal), 51)
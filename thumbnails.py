@@ -0,0 +1,146 @@
+"""Resized variants of uploaded event images, made in worker processes.
+
+Event cards used to show the image exactly as the admin uploaded it, often
+hundreds of KB for a box 160 pixels high. When an image is stored, the
+pipeline resizes it to every size in ``VARIANTS`` and encodes each as WebP and
+JPEG, in a pool of processes so requests never wait for it. The variants are
+stored in the blob store under names derived from the original's digest
+(``<digest>-card.webp``), so the event can link them right away; until a
+variant is written, /media redirects to the original.
+
+Resizing needs Pillow. Without it ``available`` is False and events keep
+linking the original image only.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional: no variants
+    Image = None
+
+# Variant -> longest side in pixels, smallest first
+VARIANTS = {
+    "thumbnail": 160,
+    "card": 480,
+    "full": 1600,
+}
+# Encodings of every variant; browsers without WebP use the JPEG
+FORMATS = {
+    "image/webp": ("WEBP", {"quality": 80, "method": 4}),
+    "image/jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def has_alpha(image):
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def flatten(image):
+    # JPEG has no transparency: put transparent images on a white background
+    if has_alpha(image):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_variants(raw):
+    """Resize image bytes into ``{variant: {mime_type: bytes}}``; runs in a worker process."""
+    with Image.open(io.BytesIO(raw)) as source:
+        image = ImageOps.exif_transpose(source)  # Phone photos store their rotation in EXIF
+        image.load()
+    variants = {}
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)  # Never enlarges
+        variants[variant] = {}
+        for mime_type, (image_format, options) in FORMATS.items():
+            output = io.BytesIO()
+            if image_format == "WEBP":
+                frame = resized.convert("RGBA" if has_alpha(resized) else "RGB")
+            else:
+                frame = flatten(resized)
+            frame.save(output, image_format, **options)
+            variants[variant][mime_type] = output.getvalue()
+    return variants
+
+
+class ThumbnailPipeline:
+    """Pool of processes writing the resized variants of stored images."""
+
+    def __init__(self, blobs, workers=None):
+        self.blobs = blobs
+        self.workers = workers or min(os.cpu_count() or 1, 2)
+        self._lock = threading.Lock()
+        self._pool = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _executor(self):
+        # Started on first use, so importing the app does not fork processes
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def urls(self, name):
+        """``{variant: {"webp": url, "jpeg": url}}`` of blob ``name``, written or not."""
+        return {
+            variant: {
+                image_format.lower(): self.blobs.url_for(self.blobs.variant_name(name, variant, mime_type))
+                for mime_type, (image_format, _) in FORMATS.items()
+            }
+            for variant in VARIANTS
+        }
+
+    def submit(self, name, raw):
+        """Make the variants of blob ``name`` (content ``raw``) in the background."""
+        if not self.available:
+            return
+        with self._lock:
+            self.pending += 1
+        future = self._executor().submit(render_variants, raw)
+        future.add_done_callback(lambda future: self._store(name, future))
+
+    def _store(self, name, future):
+        try:
+            for variant, encoded in future.result().items():
+                for mime_type, data in encoded.items():
+                    self.blobs.put_variant(name, variant, data, mime_type)
+        except Exception as e:
+            # Undecodable image: links to the variants keep redirecting to the original
+            print(f"Could not resize image {name}: {e}")
+            with self._lock:
+                self.failed += 1
+        else:
+            with self._lock:
+                self.completed += 1
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self):
+        """Wait for the pending jobs and stop the pool."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        # Outside the lock: the callbacks of the last jobs take it
+        if pool is not None:
+            pool.shutdown()
+
+    def stats(self):
+        return {
+            "available": self.available,
+            "workers": self.workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }